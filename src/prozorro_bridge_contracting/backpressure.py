@@ -0,0 +1,190 @@
+from typing import Callable, Optional
+import asyncio
+import json
+import os
+import time
+
+from prozorro_bridge_contracting.checkpoint import CHECKPOINTER
+from prozorro_bridge_contracting.metrics import Counter, Gauge
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    MEMORY_HIGH_WATERMARK,
+    MEMORY_LOW_WATERMARK,
+    PENDING_CONTRACTS_HIGH_WATERMARK,
+    PENDING_CONTRACTS_LOW_WATERMARK,
+    PENDING_BYTES_HIGH_WATERMARK,
+    PENDING_BYTES_LOW_WATERMARK,
+    BACKPRESSURE_CHECK_INTERVAL,
+    BACKPRESSURE_MAX_PAUSE,
+)
+
+
+RSS = Gauge(
+    "contracting_bridge_rss_bytes",
+    "Resident memory of the bridge process",
+)
+PENDING_WORK = Gauge(
+    "contracting_bridge_pending_work",
+    "Tenders, contracts and approximate contract bytes held by scheduled work",
+)
+INTAKE_PAUSED = Gauge(
+    "contracting_bridge_feed_intake_paused",
+    "1 while feed intake is paused above the high watermark",
+)
+INTAKE_TRANSITIONS = Counter(
+    "contracting_bridge_feed_intake_transitions_total",
+    "Feed intake pauses (by the watermark crossed) and resumes",
+)
+
+
+def get_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_items_size(items: list) -> int:
+    return sum(len(json.dumps(item.contract)) + len(json.dumps(item.procuring_entity)) for item in items)
+
+
+class Backpressure:
+    """
+    Pauses feed intake while RSS (bytes), pending contracts or pending contract bytes are above their high watermarks
+    and resumes it once all are at or below the low ones, so catch-up stays under the memory limit.
+    A watermark of 0 disables the check.
+
+    The freed memory is seldom returned to the OS, so intake is not paused (or is resumed) once only
+    parked tenders are left pending (nothing else would drain), and is resumed after `max_pause` seconds.
+    Tenders of a page are admitted one by one, so a page started above a watermark waits for its own work.
+    """
+
+    def __init__(
+        self, high_rss: int, low_rss: int, high_contracts: int, low_contracts: int, interval: float,
+        high_bytes: int = 0, low_bytes: int = 0, max_pause: float = 0,
+    ) -> None:
+        self.high_rss = high_rss
+        self.low_rss = low_rss
+        self.high_contracts = high_contracts
+        self.low_contracts = low_contracts
+        self.high_bytes = high_bytes
+        self.low_bytes = low_bytes
+        self.interval = interval
+        self.max_pause = max_pause
+        self.paused = False
+        # id of scheduled contract items list -> (contracts, bytes) it was added with
+        self.held = {}
+        self.tenders = 0
+        self.contracts = 0
+        self.size = 0
+
+    def add(self, items: list) -> None:
+        if id(items) in self.held:
+            return
+        # serializing every contract is paid only when there is a bytes watermark to check
+        size = get_items_size(items) if self.high_bytes else 0
+        self.held[id(items)] = (len(items), size)
+        self._update(1, *self.held[id(items)])
+
+    def remove(self, items: list) -> None:
+        held = self.held.pop(id(items), None)
+        if held is not None:
+            contracts, size = held
+            self._update(-1, -contracts, -size)
+
+    def _update(self, tenders: int, contracts: int, size: int) -> None:
+        self.tenders += tenders
+        self.contracts += contracts
+        self.size += size
+        PENDING_WORK.set(self.tenders, kind="tenders")
+        PENDING_WORK.set(self.contracts, kind="contracts")
+        PENDING_WORK.set(self.size, kind="bytes")
+
+    def get_exceeded(self) -> Optional[str]:
+        """
+        Returns the high watermark crossed or None
+        """
+        rss = get_rss()
+        if rss is not None:
+            RSS.set(rss)
+            if self.high_rss and rss >= self.high_rss:
+                return "memory"
+        return self.get_pending_exceeded()
+
+    def get_pending_exceeded(self) -> Optional[str]:
+        if self.high_contracts and self.contracts >= self.high_contracts:
+            return "contracts"
+        if self.high_bytes and self.size >= self.high_bytes:
+            return "bytes"
+        return None
+
+    def is_relieved(self) -> bool:
+        rss = get_rss()
+        if rss is not None:
+            RSS.set(rss)
+            if self.high_rss and rss > self.low_rss:
+                return False
+        if self.high_bytes and self.size > self.low_bytes:
+            return False
+        return not self.high_contracts or self.contracts <= self.low_contracts
+
+    async def admit(self, stop: Callable[[], bool] = lambda: False) -> None:
+        """
+        Called before each tender of a page is started, so an oversized page doesn't start more work
+        than the watermarks allow
+        """
+        if not self.high_rss and not self.high_contracts and not self.high_bytes:
+            return
+        # the tender started last adds its contracts to pending work once it runs
+        await asyncio.sleep(0)
+        await self.wait(stop)
+
+    def is_draining(self) -> bool:
+        # parked tenders may stay pending for long, waiting for them wouldn't release anything
+        return self.tenders > len(PARKING)
+
+    async def wait(self, stop: Callable[[], bool] = lambda: False) -> None:
+        """
+        Called before a feed page is scheduled, holds the crawler while the bridge is above a watermark
+        """
+        watermark = self.get_exceeded()
+        if watermark is None:
+            return
+        if not self.is_draining():
+            # nothing pending would release memory, pausing would only delay the next page
+            return
+        self.paused = True
+        INTAKE_PAUSED.set(1)
+        INTAKE_TRANSITIONS.inc(state="paused", watermark=watermark)
+        LOGGER.warning(
+            f"Feed intake paused above {watermark} high watermark: "
+            f"rss {get_rss()} bytes, {self.tenders} tenders, {self.contracts} contracts pending"
+        )
+        # restart after an OOM kill shouldn't redo the pages handled so far
+        await CHECKPOINTER.flush()
+        started = time.monotonic()
+        while not self.is_relieved() and self.is_draining() and not stop():
+            if self.max_pause and time.monotonic() - started >= self.max_pause:
+                LOGGER.warning(f"Feed intake resumed above the low watermarks after {self.max_pause} seconds")
+                break
+            await asyncio.sleep(self.interval)
+        self.paused = False
+        INTAKE_PAUSED.set(0)
+        INTAKE_TRANSITIONS.inc(state="resumed")
+        LOGGER.info(
+            f"Feed intake resumed: rss {get_rss()} bytes, {self.tenders} tenders, {self.contracts} contracts pending"
+        )
+
+
+BACKPRESSURE = Backpressure(
+    MEMORY_HIGH_WATERMARK,
+    MEMORY_LOW_WATERMARK,
+    PENDING_CONTRACTS_HIGH_WATERMARK,
+    PENDING_CONTRACTS_LOW_WATERMARK,
+    BACKPRESSURE_CHECK_INTERVAL,
+    PENDING_BYTES_HIGH_WATERMARK,
+    PENDING_BYTES_LOW_WATERMARK,
+    BACKPRESSURE_MAX_PAUSE,
+)
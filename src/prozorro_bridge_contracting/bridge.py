@@ -1,10 +1,44 @@
-from aiohttp import ClientSession
+from aiohttp import (
+    ClientSession,
+    ClientTimeout,
+    ClientOSError,
+    ClientPayloadError,
+    ServerDisconnectedError,
+)
+from typing import Awaitable, Optional
 import asyncio
 import json
 
 from prozorro_crawler.settings import CRAWLER_USER_AGENT, API_VERSION
-from prozorro_bridge_contracting.settings import LOGGER, ERROR_INTERVAL, API_TOKEN, API_HOST
-from prozorro_bridge_contracting.utils import journal_context
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    ERROR_INTERVAL,
+    API_TOKEN,
+    API_HOST,
+    CONTRACT_CONNECT_TIMEOUT,
+    CONTRACT_READ_TIMEOUT,
+    CREDENTIALS_CONNECT_TIMEOUT,
+    CREDENTIALS_READ_TIMEOUT,
+    TENDER_CONNECT_TIMEOUT,
+    TENDER_READ_TIMEOUT,
+    POST_CONNECT_TIMEOUT,
+    POST_READ_TIMEOUT,
+    CONTRACT_DEADLINE,
+    TENDER_DEADLINE,
+)
+from prozorro_bridge_contracting.backpressure import BACKPRESSURE
+from prozorro_bridge_contracting.catchup import CATCH_UP
+from prozorro_bridge_contracting.compression import post_json, observe_response
+from prozorro_bridge_contracting.hedging import HEDGER
+from prozorro_bridge_contracting.inflight import TENDERS_IN_FLIGHT, CONTRACTS_IN_FLIGHT
+from prozorro_bridge_contracting.introspection import track, set_stage, record_error
+from prozorro_bridge_contracting.metrics import CONTRACT_SYNC_LAG, Counter
+from prozorro_bridge_contracting.parking import PARKING, ParkTender, RetryBudget, retry_budget
+from prozorro_bridge_contracting.prefilter import get_rejection_rule
+from prozorro_bridge_contracting.scheduler import SCHEDULER, BACKLOG_LANE, RETRY_LANE
+from prozorro_bridge_contracting.utils import journal_context, seconds_since
+from prozorro_bridge_contracting.validation import validate_contract
+from prozorro_bridge_contracting.workitems import ContractWorkItem, get_contract_items
 from prozorro_bridge_contracting.journal_msg_ids import (
     DATABRIDGE_EXCEPTION,
     DATABRIDGE_GET_CREDENTIALS,
@@ -15,7 +49,7 @@ from prozorro_bridge_contracting.journal_msg_ids import (
     DATABRIDGE_CONTRACT_CREATED,
     DATABRIDGE_INFO,
     DATABRIDGE_FOUND_ACTIVE_CONTRACTS,
-    DATABRIDGE_DATE_MISMATCH,
+    DATABRIDGE_INVALID_CONTRACT,
 )
 
 
@@ -23,18 +57,64 @@ BASE_URL = f"{API_HOST}/api/{API_VERSION}"
 
 HEADERS = {
     "Content-Type": "application/json",
+    "Accept-Encoding": "gzip, deflate",
     "Authorization": f"Bearer {API_TOKEN}",
     "User-Agent": CRAWLER_USER_AGENT,
 }
 
+CONTRACT_TIMEOUT = ClientTimeout(sock_connect=CONTRACT_CONNECT_TIMEOUT, sock_read=CONTRACT_READ_TIMEOUT)
+CREDENTIALS_TIMEOUT = ClientTimeout(sock_connect=CREDENTIALS_CONNECT_TIMEOUT, sock_read=CREDENTIALS_READ_TIMEOUT)
+TENDER_TIMEOUT = ClientTimeout(sock_connect=TENDER_CONNECT_TIMEOUT, sock_read=TENDER_READ_TIMEOUT)
+POST_TIMEOUT = ClientTimeout(sock_connect=POST_CONNECT_TIMEOUT, sock_read=POST_READ_TIMEOUT)
 
-def check_tender(tender: dict) -> bool:
-    LOGGER.debug(f"Checking tender from feed: {repr(tender)}")
+DEADLINE_EXCEEDED = Counter(
+    "contracting_bridge_deadline_exceeded_total",
+    "Contracts and tenders cancelled and rescheduled after running out of their deadline budget",
+)
+
+
+POST_RECONCILED = Counter(
+    "contracting_bridge_post_reconciled_total",
+    "Existence checks of contracts after ambiguous POST failures by result (exists, missing)",
+)
+
+# errors after which it's unknown whether the POST request was accepted
+AMBIGUOUS_POST_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionResetError,
+    ClientOSError,
+    ClientPayloadError,
+    ServerDisconnectedError,
+)
+# gateway responses after which the api may have accepted the POST as well
+AMBIGUOUS_POST_STATUSES = (502, 503, 504)
 
-    if tender["procurementMethodType"] in ("competitiveDialogueUA", "competitiveDialogueEU", "esco"):
-        return False
 
-    if any(contract["status"] == "active" for contract in tender.get("contracts", [])):
+class DeadlineExceeded(Exception):
+    pass
+
+
+async def run_with_deadline(awaitable: Awaitable, deadline: float, scope: str):
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+    try:
+        return await asyncio.wait_for(awaitable, deadline)
+    except asyncio.TimeoutError:
+        # http timeouts of the awaitable itself are timeout errors too
+        if loop.time() - started < deadline:
+            raise
+        DEADLINE_EXCEEDED.inc(scope=scope)
+        raise DeadlineExceeded(f"{scope.capitalize()} deadline of {deadline} seconds exceeded")
+
+
+def check_tender(tender: dict) -> bool:
+    rule = get_rejection_rule(tender)
+    if CATCH_UP.active:
+        # formatting and logging every tender is too expensive to catch up
+        return rule is None
+
+    LOGGER.debug(f"Checking tender from feed: {repr(tender)}")
+    if rule is None:
         LOGGER.info(
             f"Found tender {tender['id']} with active contracts",
             extra=journal_context(
@@ -42,7 +122,7 @@ def check_tender(tender: dict) -> bool:
                 {"TENDER_ID": tender["id"]}
             ),
         )
-    else:
+    elif rule == "contract_status":
         LOGGER.debug(
             f"Skipping tender {tender['id']} with no active contracts",
             extra=journal_context(
@@ -50,9 +130,7 @@ def check_tender(tender: dict) -> bool:
                 params={"TENDER_ID": tender["id"]}
             ),
         )
-        return False
-
-    return True
+    return rule is None
 
 
 def extend_contract(contract: dict, tender: dict) -> None:
@@ -61,22 +139,6 @@ def extend_contract(contract: dict, tender: dict) -> None:
     if tender.get("mode"):
         contract["mode"] = tender["mode"]
 
-    # Fix deliveryDate
-    for item in contract.get("items", []):
-        if "deliveryDate" in item and item["deliveryDate"].get("startDate") and item["deliveryDate"].get("endDate"):
-            if item["deliveryDate"]["startDate"] > item["deliveryDate"]["endDate"]:
-                journal_params = {"CONTRACT_ID": contract["id"], "TENDER_ID": tender["id"]}
-                LOGGER.info(
-                    f"Found dates mismatch "
-                    f"{item['deliveryDate']['startDate']} and {item['deliveryDate']['endDate']}",
-                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_DATE_MISMATCH}, journal_params),
-                )
-                del item["deliveryDate"]["startDate"]
-                LOGGER.info(
-                    "startDate value cleaned.",
-                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_DATE_MISMATCH}, journal_params),
-                )
-
 
 async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict:
     url = f"{BASE_URL}/tenders/{tender_id}/extract_credentials"
@@ -88,9 +150,12 @@ async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict
                 {"TENDER_ID": tender_id}
             ),
         )
+        set_stage("credentials")
         try:
-            response = await session.get(url, headers=HEADERS)
-            data = await response.text()
+            response, data = await HEDGER.request(
+                "credentials", session, "get", url, headers=HEADERS, timeout=CREDENTIALS_TIMEOUT
+            )
+            observe_response(response, data)
             if response.status == 200:
                 data = json.loads(data)
                 LOGGER.info(
@@ -110,64 +175,164 @@ async def get_tender_credentials(tender_id: str, session: ClientSession) -> dict
                     {"TENDER_ID": tender_id}
                 ),
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            record_error(e)
+            await SCHEDULER.backoff(ERROR_INTERVAL)
 
 
-async def process_tender_contracts(tender: dict, session: ClientSession) -> list:
-    while True:
-        try:
-            for contract in tender.get("contracts", []):
-                if contract["status"] != "active":
-                    LOGGER.debug(
-                        f"Skipping contract {contract['id']} of tender {tender['id']} in status {contract['status']}",
-                        extra=journal_context(
-                            {"MESSAGE_ID": DATABRIDGE_INFO},
-                            params={
-                                "TENDER_ID": tender["id"],
-                                "CONTRACT_ID": contract["id"],
-                            }
-                        ),
-                    )
-                    continue
+async def fetch_contract_details(item: ContractWorkItem, session: ClientSession, siblings: list = ()) -> None:
+    """
+    Light feed items don't carry procuringEntity, so the full tender is fetched
+    only when its contract actually has to be created.
+    Light sibling items of the same tender are filled from the same response, so the tender is fetched once.
+    Items of contracts that are not active anymore keep only the actual status.
+    """
+    from prozorro_bridge_contracting.single import get_tender
 
-                response = await session.head(f"{BASE_URL}/contracts/{contract['id']}", headers=HEADERS)
-                if response.status == 404:
-                    LOGGER.info(
-                        f"Sync contract {contract['id']} of tender {tender['id']}",
-                        extra=journal_context(
-                            {"MESSAGE_ID": DATABRIDGE_CONTRACT_TO_SYNC},
-                            {"CONTRACT_ID": contract["id"], "TENDER_ID": tender["id"]},
-                        ),
-                    )
-                    extend_contract(contract, tender)
-                    await prepare_contract_data(contract, session)
-                    await post_contract(contract, session)
-                elif response.status != 200:
-                    data = await response.text()
-                    LOGGER.warning(
-                        f"Fail to contract existence {contract['id']}. Error message: {str(data)}",
-                        extra=journal_context(
-                            {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
-                            params={"TENDER_ID": tender["id"], "CONTRACT_ID": contract["id"]},
-                        ),
-                    )
-                    raise ConnectionError(f"Tender {tender['id']} should be resynced")
-                else:
-                    LOGGER.info(
-                        f"Contract exists {contract['id']}",
-                        extra=journal_context(
-                            {"MESSAGE_ID": DATABRIDGE_CONTRACT_EXISTS},
-                            {"TENDER_ID": tender["id"], "CONTRACT_ID": contract["id"]},
-                        ),
-                    )
-                    continue
-            break
-        except Exception as e:
+    tender = await get_tender(item.tender_id, session)
+    contracts = {contract["id"]: contract for contract in tender.get("contracts", [])}
+    for light_item in (item, *siblings):
+        if light_item.procuring_entity is not None:
+            continue
+        contract = contracts.get(light_item.contract_id)
+        if contract is not None and contract["status"] == "active":
+            light_item.contract = contract
+        else:
+            light_item.contract = {"id": light_item.contract_id, "status": contract and contract["status"]}
+        light_item.procuring_entity = tender["procuringEntity"]
+        light_item.mode = tender.get("mode")
+
+
+async def sync_contract(item: ContractWorkItem, session: ClientSession, siblings: list = ()) -> None:
+    contract = item.contract
+    set_stage("head")
+    response, _ = await HEDGER.request(
+        "contract", session, "head", f"{BASE_URL}/contracts/{contract['id']}",
+        read=False, headers=HEADERS, timeout=CONTRACT_TIMEOUT,
+    )
+    if response.status == 404:
+        if item.procuring_entity is None:
+            await fetch_contract_details(item, session, siblings)
+        if item.contract["status"] != "active":
+            LOGGER.info(
+                f"Skipping contract {contract['id']} of tender {item.tender_id} that is not active anymore",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_INFO},
+                    {"CONTRACT_ID": contract["id"], "TENDER_ID": item.tender_id},
+                ),
+            )
+            return
+        contract = item.contract
+        LOGGER.info(
+            f"Sync contract {contract['id']} of tender {item.tender_id}",
+            extra=journal_context(
+                {"MESSAGE_ID": DATABRIDGE_CONTRACT_TO_SYNC},
+                {"CONTRACT_ID": contract["id"], "TENDER_ID": item.tender_id},
+            ),
+        )
+        extend_contract(contract, item.tender)
+        problem = validate_contract(contract)
+        if problem is not None:
+            LOGGER.error(
+                f"ATTENTION! Invalid contract {contract['id']} of tender {item.tender_id}. "
+                f"This contract won't be processed. Problem: {problem}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_INVALID_CONTRACT},
+                    {"CONTRACT_ID": contract["id"], "TENDER_ID": item.tender_id},
+                ),
+            )
+            return
+        set_stage("prepare")
+        await prepare_contract_data(contract, session)
+        await post_contract(contract, session, item.date_modified)
+    elif response.status != 200:
+        data = await response.text()
+        LOGGER.warning(
+            f"Fail to contract existence {contract['id']}. Error message: {str(data)}",
+            extra=journal_context(
+                {"MESSAGE_ID": DATABRIDGE_EXCEPTION},
+                params={"TENDER_ID": item.tender_id, "CONTRACT_ID": contract["id"]},
+            ),
+        )
+        raise ConnectionError(f"Tender {item.tender_id} should be resynced")
+    else:
+        CATCH_UP.mark_synced(contract["id"])
+        if not CATCH_UP.active:
             LOGGER.info(
-                f"Fail to handle tender contracts. Exception: {type(e)} {e}",
-                extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION})
+                f"Contract exists {contract['id']}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_CONTRACT_EXISTS},
+                    {"TENDER_ID": item.tender_id, "CONTRACT_ID": contract["id"]},
+                ),
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+
+
+async def sync_contract_items(items: list, session: ClientSession, lane: str) -> None:
+    set_stage(f"waiting {lane} slot")
+    async with SCHEDULER.slot(lane):
+        set_stage("contracts")
+        # time spent queued for the slot doesn't count against the tender deadline
+        await run_with_deadline(sync_contracts(items, session), TENDER_DEADLINE, "tender")
+
+
+async def sync_contracts(items: list, session: ClientSession) -> None:
+    while items:
+        item = items[0]
+        with track("contract", item.contract_id):
+            # the same contract can be synced at the moment by another coroutine
+            await run_with_deadline(
+                CONTRACTS_IN_FLIGHT.run(item.contract_id, None, lambda: sync_contract(item, session, items)),
+                CONTRACT_DEADLINE, "contract",
+            )
+        # synced contracts are released right away and not checked again on retries
+        items.pop(0)
+
+
+async def process_contract_items(
+    items: list, session: ClientSession, lane: str = BACKLOG_LANE, parked: bool = False
+) -> None:
+    # parked items stay pending until the parked retry is done with them
+    BACKPRESSURE.add(items)
+    handed_over = False
+    tender_id = items[0].tender_id if items else None
+    budget = None if parked else RetryBudget()
+    token = retry_budget.set(budget)
+    try:
+        with track("parked tender" if parked else "tender", tender_id):
+            while True:
+                try:
+                    await sync_contract_items(items, session, lane)
+                    break
+                except Exception as e:
+                    LOGGER.info(
+                        f"Fail to handle tender contracts. Exception: {type(e)} {e}",
+                        extra=journal_context({"MESSAGE_ID": DATABRIDGE_EXCEPTION})
+                    )
+                    record_error(e, "retry sleep")
+                    lane = RETRY_LANE
+                    if budget is None:
+                        await asyncio.sleep(ERROR_INTERVAL)
+                        continue
+                    budget.attempts += 1
+                    # inner retry loops raise ParkTender once the tender has been failing for too long
+                    if (
+                        (isinstance(e, ParkTender) or PARKING.should_park(budget.attempts, budget.elapsed))
+                        and PARKING.park(items, process_contract_items(items, session, RETRY_LANE, parked=True))
+                    ):
+                        LOGGER.info(
+                            f"Tender {tender_id} is parked after {budget.attempts} attempts",
+                            extra=journal_context({"MESSAGE_ID": DATABRIDGE_INFO}, {"TENDER_ID": tender_id}),
+                        )
+                        handed_over = True
+                        break
+                    await asyncio.sleep(ERROR_INTERVAL)
+    finally:
+        retry_budget.reset(token)
+        if not handed_over:
+            BACKPRESSURE.remove(items)
+
+
+async def process_tender_contracts(tender: dict, session: ClientSession, lane: str = BACKLOG_LANE) -> None:
+    await process_contract_items(get_contract_items(tender), session, lane)
 
 
 async def prepare_contract_data(contract: dict, session: ClientSession, credentials: dict = None) -> None:
@@ -178,9 +343,48 @@ async def prepare_contract_data(contract: dict, session: ClientSession, credenti
     contract["tender_token"] = data["tender_token"]
 
 
-async def post_contract(contract: dict, session: ClientSession) -> None:
+def observe_sync_lag(contract: dict, date_modified: str = None) -> None:
+    lag = seconds_since(contract.get("date") or date_modified)
+    if lag is not None:
+        CONTRACT_SYNC_LAG.observe(max(lag, 0))
+
+
+async def contract_exists(contract_id: str, session: ClientSession) -> bool:
+    response, _ = await HEDGER.request(
+        "contract", session, "head", f"{BASE_URL}/contracts/{contract_id}",
+        read=False, headers=HEADERS, timeout=CONTRACT_TIMEOUT,
+    )
+    if response.status == 200:
+        return True
+    elif response.status == 404:
+        return False
+    data = await response.text()
+    raise ConnectionError(f"Fail to check contract {contract_id} existence. Error message: {data}")
+
+
+async def post_contract(contract: dict, session: ClientSession, date_modified: str = None) -> None:
+    # after a timeout or a dropped connection the previous POST may have been accepted,
+    # so existence is checked before uploading the contract again
+    maybe_uploaded = False
     while True:
         try:
+            if maybe_uploaded:
+                set_stage("reconcile")
+                exists = await contract_exists(contract["id"], session)
+                POST_RECONCILED.inc(result="exists" if exists else "missing")
+                if exists:
+                    LOGGER.info(
+                        f"Contract {contract['id']} of tender {contract['tender_id']} "
+                        f"was created by the previous interrupted request",
+                        extra=journal_context(
+                            {"MESSAGE_ID": DATABRIDGE_CONTRACT_CREATED},
+                            {"CONTRACT_ID": contract["id"], "TENDER_ID": contract["tender_id"]},
+                        ),
+                    )
+                    observe_sync_lag(contract, date_modified)
+                    CATCH_UP.mark_synced(contract["id"])
+                    break
+                maybe_uploaded = False
             LOGGER.info(
                 f"Creating contract {contract['id']} of tender {contract['tender_id']}",
                 extra=journal_context(
@@ -188,7 +392,10 @@ async def post_contract(contract: dict, session: ClientSession) -> None:
                     {"CONTRACT_ID": contract["id"], "TENDER_ID": contract["tender_id"]},
                 ),
             )
-            response = await session.post(f"{BASE_URL}/contracts", json={"data": contract}, headers=HEADERS)
+            set_stage("post")
+            response = await post_json(
+                session, f"{BASE_URL}/contracts", {"data": contract}, HEADERS, timeout=POST_TIMEOUT
+            )
             if response.status == 422:
                 data = await response.text()
                 LOGGER.error(
@@ -207,12 +414,15 @@ async def post_contract(contract: dict, session: ClientSession) -> None:
                         {"CONTRACT_ID": contract["id"], "TENDER_ID": contract["tender_id"]},
                     )
                 )
+                CATCH_UP.mark_synced(contract["id"])
                 break
             elif response.status == (403, 410, 404, 405):
                 data = await response.text()
                 raise PermissionError(data)
             elif response.status != 201:
                 data = await response.text()
+                if response.status in AMBIGUOUS_POST_STATUSES:
+                    maybe_uploaded = True
                 raise ConnectionError(data)
 
             LOGGER.info(
@@ -222,8 +432,12 @@ async def post_contract(contract: dict, session: ClientSession) -> None:
                     {"CONTRACT_ID": contract["id"], "TENDER_ID": contract["tender_id"]},
                 ),
             )
+            observe_sync_lag(contract, date_modified)
+            CATCH_UP.mark_synced(contract["id"])
             break
         except Exception as e:
+            if isinstance(e, AMBIGUOUS_POST_ERRORS):
+                maybe_uploaded = True
             LOGGER.warning(
                 f"Unsuccessful put for contract {contract['id']} of tender {contract['tender_id']}. "
                 f"Exception: {type(e)} {e}",
@@ -232,9 +446,28 @@ async def post_contract(contract: dict, session: ClientSession) -> None:
                     {"CONTRACT_ID": contract["id"], "TENDER_ID": contract["tender_id"]},
                 ),
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            record_error(e)
+            await SCHEDULER.backoff(ERROR_INTERVAL)
+
+
+def schedule_listing(session: ClientSession, tender: dict, lane: str = BACKLOG_LANE) -> Optional[Awaitable]:
+    """
+    Returns an awaitable processing contracts of the feed tender or None if there's nothing to do.
+    The awaitable holds compact contract work items only, not the tender itself.
+    """
+    if not check_tender(tender):
+        return None
+    items = get_contract_items(tender)
+    if CATCH_UP.should_skip(items):
+        return None
+    # a tender modified again while still in flight supersedes the running sighting instead of racing it
+    return TENDERS_IN_FLIGHT.run(
+        tender["id"], tender.get("dateModified"),
+        lambda: process_contract_items(items, session, lane),
+    )
 
 
-async def process_listing(session: ClientSession, tender: dict) -> None:
-    if check_tender(tender):
-        await process_tender_contracts(tender, session)
+async def process_listing(session: ClientSession, tender: dict, lane: str = BACKLOG_LANE) -> None:
+    coroutine = schedule_listing(session, tender, lane)
+    if coroutine is not None:
+        await coroutine
@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from typing import Optional
+import time
+
+from prozorro_bridge_contracting.metrics import Counter, Gauge
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.scheduler import SCHEDULER
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    CATCH_UP_LAG,
+    CATCH_UP_EXIT_LAG,
+    CATCH_UP_MIN_DURATION,
+    CATCH_UP_CONCURRENCY_FACTOR,
+    CATCH_UP_PARK_AFTER_ATTEMPTS,
+    CATCH_UP_PARK_AFTER_SECONDS,
+    SYNCED_CONTRACTS_CACHE_SIZE,
+)
+from prozorro_bridge_contracting.utils import parse_date
+
+
+CATCH_UP_ACTIVE = Gauge(
+    "contracting_bridge_catch_up",
+    "1 while the bridge works in the catch-up profile",
+)
+CATCH_UP_SKIPPED = Counter(
+    "contracting_bridge_catch_up_skipped_total",
+    "Feed tenders skipped in catch-up mode because all their contracts were synced before",
+)
+
+
+class CatchUp:
+    """
+    Switches to the catch-up profile while the feed lag is above `enter_lag` seconds
+    and back once it's down to `exit_lag`: lanes get `concurrency_factor` times more slots,
+    failing tenders are parked sooner, nonessential logging is skipped
+    and tenders whose contracts are all in the synced contracts cache are not checked again.
+    A mode is kept at least `min_duration` seconds, so lag spikes don't rescale lanes on every page.
+    """
+
+    def __init__(
+        self, enter_lag: float, exit_lag: float, concurrency_factor: float,
+        park_after_attempts: int, park_after_seconds: float, cache_size: int, min_duration: float = 0,
+    ) -> None:
+        self.enter_lag = enter_lag
+        self.exit_lag = exit_lag
+        self.min_duration = min_duration
+        # time.monotonic() of the last mode switch
+        self.switched_at = None
+        self.concurrency_factor = concurrency_factor
+        self.park_after_attempts = park_after_attempts
+        self.park_after_seconds = park_after_seconds
+        self.cache_size = cache_size
+        self.active = False
+        self.steady = None
+        # ids of contracts that exist in contracting, least recently seen first
+        self.synced = OrderedDict()
+
+    def update(self, feed_lag: float) -> None:
+        if not self.enter_lag:
+            return
+        if self.switched_at is not None and time.monotonic() - self.switched_at < self.min_duration:
+            return
+        if not self.active and feed_lag >= self.enter_lag:
+            self.enter(feed_lag)
+        elif self.active and feed_lag <= self.exit_lag:
+            self.exit(feed_lag)
+
+    def enter(self, feed_lag: float) -> None:
+        self.active = True
+        self.switched_at = time.monotonic()
+        self.steady = (
+            {name: lane.limit for name, lane in SCHEDULER.lanes.items()},
+            PARKING.after_attempts,
+            PARKING.after_seconds,
+        )
+        for lane in SCHEDULER.lanes.values():
+            lane.set_limit(int(lane.limit * self.concurrency_factor))
+        PARKING.after_attempts = min(PARKING.after_attempts, self.park_after_attempts)
+        PARKING.after_seconds = min(PARKING.after_seconds, self.park_after_seconds)
+        CATCH_UP_ACTIVE.set(1)
+        LOGGER.info(f"Feed lag is {feed_lag:.0f} seconds, switching to catch-up mode: {SCHEDULER.stats()}")
+
+    def exit(self, feed_lag: float) -> None:
+        self.active = False
+        self.switched_at = time.monotonic()
+        limits, PARKING.after_attempts, PARKING.after_seconds = self.steady
+        for name, limit in limits.items():
+            SCHEDULER.lanes[name].set_limit(limit)
+        CATCH_UP_ACTIVE.set(0)
+        LOGGER.info(f"Feed lag is {feed_lag:.0f} seconds, catch-up mode is over: {SCHEDULER.stats()}")
+
+    def mark_synced(self, contract_id: str) -> None:
+        if not self.cache_size:
+            return
+        self.synced[contract_id] = None
+        self.synced.move_to_end(contract_id)
+        if len(self.synced) > self.cache_size:
+            self.synced.popitem(last=False)
+
+    def should_skip(self, items: list) -> bool:
+        if not self.active or not items or not all(item.contract_id in self.synced for item in items):
+            return False
+        CATCH_UP_SKIPPED.inc()
+        return True
+
+
+class FeedHead:
+    """
+    Tracks the newest tender modification seen in the feed. The forward crawler reads from the point
+    the backward one goes back from, so backward pages never move the head and don't make the lag jump.
+    """
+
+    def __init__(self) -> None:
+        self.date = None
+
+    def get_lag(self, items: list) -> Optional[float]:
+        """
+        Moves the head with a feed page, returns the feed lag in seconds
+        """
+        # pages are sorted by dateModified, ascending for the forward crawler and descending for the backward one
+        for item in (items[0], items[-1]) if items else ():
+            date = parse_date(item.get("dateModified"))
+            if date is not None and (self.date is None or date > self.date):
+                self.date = date
+        if self.date is None:
+            return None
+        return time.time() - self.date.timestamp()
+
+
+FEED_HEAD = FeedHead()
+CATCH_UP = CatchUp(
+    CATCH_UP_LAG,
+    CATCH_UP_EXIT_LAG,
+    CATCH_UP_CONCURRENCY_FACTOR,
+    CATCH_UP_PARK_AFTER_ATTEMPTS,
+    CATCH_UP_PARK_AFTER_SECONDS,
+    SYNCED_CONTRACTS_CACHE_SIZE,
+    CATCH_UP_MIN_DURATION,
+)
@@ -0,0 +1,78 @@
+from prozorro_crawler import main as crawler_main, storage as crawler_storage
+from typing import Callable, Optional
+import time
+
+from prozorro_bridge_contracting.metrics import Counter
+from prozorro_bridge_contracting.settings import LOGGER, CHECKPOINT_PAGES, CHECKPOINT_INTERVAL
+
+
+CHECKPOINTS = Counter(
+    "contracting_bridge_feed_checkpoints_total",
+    "Feed position saves requested by the crawler and actually written",
+)
+
+
+class CheckpointCoalescer:
+    """
+    Replaces the crawler's feed position saving: the latest position is kept in memory
+    and written once per `pages` pages or `interval` seconds, and on explicit flush.
+    Fewer writes cost up to `pages` pages to be reprocessed after a crash.
+
+    A call may carry a part of the position only (e.g. the forward or the backward offset
+    $set into the same document), so position dicts of coalesced calls are merged into one write
+    instead of keeping the last call only.
+    """
+
+    def __init__(self, pages: int, interval: float) -> None:
+        self.pages = pages
+        self.interval = interval
+        self.save = None
+        self.pending = None
+        self.pending_pages = 0
+        self.saved_at = time.monotonic()
+
+    async def __call__(self, *args, **kwargs) -> None:
+        CHECKPOINTS.inc(state="requested")
+        self.pending = self.merge(self.pending, args, kwargs)
+        self.pending_pages += 1
+        if self.pending_pages >= self.pages or time.monotonic() - self.saved_at >= self.interval:
+            await self.flush()
+
+    @staticmethod
+    def merge(pending: Optional[tuple], args: tuple, kwargs: dict) -> tuple:
+        if pending is None:
+            return args, dict(kwargs)
+        pending_args, pending_kwargs = pending
+        # later values of the same keys win, keys saved by earlier calls only are kept
+        merged = [
+            {**previous, **arg} if isinstance(previous, dict) and isinstance(arg, dict) else arg
+            for previous, arg in zip(pending_args, args)
+        ]
+        merged.extend(args[len(merged):])
+        return tuple(merged), {**pending_kwargs, **kwargs}
+
+    async def flush(self) -> None:
+        if self.pending is None or self.save is None:
+            return
+        (args, kwargs), self.pending = self.pending, None
+        self.pending_pages = 0
+        self.saved_at = time.monotonic()
+        await self.save(*args, **kwargs)
+        CHECKPOINTS.inc(state="written")
+
+    def install(self, save: Optional[Callable], *modules) -> bool:
+        if save is None:
+            LOGGER.warning("Crawler feed position saving not found, checkpoints are not coalesced")
+            return False
+        self.save = save
+        for module in modules:
+            if getattr(module, "save_feed_position", None) is save:
+                module.save_feed_position = self
+        return True
+
+
+CHECKPOINTER = CheckpointCoalescer(CHECKPOINT_PAGES, CHECKPOINT_INTERVAL)
+
+
+def install_checkpointing() -> None:
+    CHECKPOINTER.install(getattr(crawler_storage, "save_feed_position", None), crawler_storage, crawler_main)
@@ -0,0 +1,68 @@
+from aiohttp import ClientResponse, ClientSession
+import gzip
+import json
+
+from prozorro_bridge_contracting.metrics import Counter
+from prozorro_bridge_contracting.settings import LOGGER, COMPRESS_REQUESTS, COMPRESS_MIN_SIZE, COMPRESS_LEVEL
+
+
+PAYLOAD_BYTES = Counter(
+    "contracting_bridge_payload_bytes_total",
+    "Request and response payload bytes before (decoded) and after (wire) compression",
+)
+RESPONSE_ENCODINGS = Counter(
+    "contracting_bridge_response_encodings_total",
+    "Api responses by content encoding",
+)
+# responses to a gzipped body that may mean the api doesn't accept the encoding
+REJECTED_ENCODING_STATUSES = (400, 415)
+
+# set once the api rejected a gzipped body, requests are not compressed after that
+compression_rejected = False
+
+
+def encode_json_body(payload: dict, headers: dict) -> dict:
+    """
+    Returns body and headers kwargs for a request,
+    bodies above COMPRESS_MIN_SIZE bytes are gzipped if COMPRESS_REQUESTS is enabled
+    """
+    if not COMPRESS_REQUESTS or compression_rejected:
+        return {"json": payload, "headers": headers}
+    body = json.dumps(payload).encode()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return {"data": body, "headers": headers}
+    compressed = gzip.compress(body, COMPRESS_LEVEL)
+    PAYLOAD_BYTES.inc(len(body), direction="request", size="decoded")
+    PAYLOAD_BYTES.inc(len(compressed), direction="request", size="wire")
+    return {"data": compressed, "headers": {**headers, "Content-Encoding": "gzip"}}
+
+
+async def post_json(session: ClientSession, url: str, payload: dict, headers: dict, **kwargs) -> ClientResponse:
+    """
+    POSTs the payload encoded by encode_json_body. A gzipped body answered with 400 or 415 is sent again
+    uncompressed, and compression is turned off if the api has rejected the encoding
+    """
+    global compression_rejected
+    body = encode_json_body(payload, headers)
+    response = await session.post(url, **body, **kwargs)
+    if "Content-Encoding" not in body["headers"] or response.status not in REJECTED_ENCODING_STATUSES:
+        return response
+    retry = await session.post(url, json=payload, headers=headers, **kwargs)
+    # the same 400 for the plain body is about the payload, not about its encoding
+    if response.status == 415 or retry.status != response.status:
+        compression_rejected = True
+        LOGGER.warning(f"Api rejected a gzipped body with {response.status}, requests are not compressed anymore")
+    return retry
+
+
+def observe_response(response: ClientResponse, data: str) -> None:
+    encoding = response.headers.get("Content-Encoding", "identity")
+    RESPONSE_ENCODINGS.inc(encoding=encoding)
+    if encoding == "identity":
+        return
+    try:
+        wire_size = int(response.headers["Content-Length"])
+    except (KeyError, TypeError, ValueError):
+        return
+    PAYLOAD_BYTES.inc(len(data.encode()), direction="response", size="decoded")
+    PAYLOAD_BYTES.inc(wire_size, direction="response", size="wire")
@@ -0,0 +1,298 @@
+from datetime import datetime, timedelta
+from hashlib import md5
+from math import ceil
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from typing import Awaitable, Callable, Optional
+import asyncio
+import time
+
+from prozorro_bridge_contracting.metrics import Counter, Gauge
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    COORDINATION,
+    COORDINATION_PARTITIONS,
+    LEASE_TTL,
+    HEARTBEAT_INTERVAL,
+    NODE_ID,
+    HANDOFF_TTL,
+    HANDOFF_REQUEUE_LIMIT,
+)
+from prozorro_bridge_contracting.storage import get_database
+from prozorro_bridge_contracting.utils import seconds_since
+
+
+OWNED_PARTITIONS = Gauge(
+    "contracting_bridge_owned_partitions",
+    "Tender id hash partitions leased by this replica",
+)
+LIVE_NODES = Gauge(
+    "contracting_bridge_live_nodes",
+    "Bridge replicas with a live heartbeat",
+)
+FOREIGN_TENDERS = Counter(
+    "contracting_bridge_foreign_tenders_total",
+    "Feed tenders skipped because their partition is leased by another replica",
+)
+HANDED_OVER_TENDERS = Counter(
+    "contracting_bridge_handed_over_tenders_total",
+    "Skipped tenders re-queued after their partition was taken over",
+)
+
+
+class Coordinator:
+    """
+    Splits tenders between bridge replicas.
+
+    Tender ids are hashed into partitions, each partition is leased by a single replica in mongodb.
+    Replicas heartbeat their node document and renew their leases, take free or expired partitions
+    up to a fair share (partitions / live replicas) and release extra ones when new replicas join,
+    so partitions of a dead replica are taken over once its leases expire.
+
+    Every replica reads the feed at its own position, so a foreign tender may be not reached yet by its owner
+    when the partition changes owner. Skipped tenders are recorded in mongodb with their partition,
+    the owner removes records of tenders it has processed, and records left for a partition are re-queued
+    (through the pending collection) by the replica that takes it over. Pending tenders are kept per partition
+    as well, so they are resumed by the replica that leases their partition only. Records expire `handoff_ttl` seconds
+    after the tender modification (tenders older than that are not recorded at all), so records of a replica
+    reading far behind the owner don't pile up, and at most `requeue_limit` latest ones are re-queued.
+
+    A replica that couldn't renew its leases for `lease_ttl` seconds stops claiming partitions,
+    they are taken over by the rest by then.
+    """
+
+    def __init__(
+        self, node_id: str, partitions: int, lease_ttl: float, heartbeat_interval: float,
+        handoff_ttl: float = HANDOFF_TTL, requeue_limit: int = HANDOFF_REQUEUE_LIMIT,
+    ) -> None:
+        self.node_id = node_id
+        self.partitions = partitions
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.handoff_ttl = handoff_ttl
+        self.requeue_limit = requeue_limit
+        # time.monotonic() of the last successful heartbeat
+        self.renewed_at = None
+        self.owned = set()
+        # live lease owners as of the last heartbeat
+        self.owners = {}
+        self.task = None
+        self.requeue = None
+        # taken over partitions whose skipped tenders are not re-queued yet
+        self.taken_over = set()
+        # foreign tenders of the current page, saved by save_skipped
+        self.skipped = []
+        # tenders of owned partitions processed during the current and the previous heartbeat interval,
+        # a skipping replica can record a tender a bit later than its owner processes it
+        self.processed = []
+        self.processed_before = []
+
+    def get_partition(self, tender_id: str) -> int:
+        return int(md5(tender_id.encode()).hexdigest()[:8], 16) % self.partitions
+
+    def get_pending_record(self, tender_id: str) -> dict:
+        # pending tenders are resumed by the replica that leases their partition
+        return {"_id": tender_id, "node": self.node_id, "partition": self.get_partition(tender_id)}
+
+    def is_leased(self) -> bool:
+        return self.renewed_at is not None and time.monotonic() - self.renewed_at < self.lease_ttl
+
+    async def wait_leased(self, stop: Callable[[], bool] = lambda: False) -> None:
+        """
+        Holds the crawler while the replica can't renew its leases
+        """
+        while self.task is not None and not self.is_leased() and not stop():
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def owns(self, tender_id: str, date_modified: str = None) -> bool:
+        if self.task is None:
+            return True
+        partition = self.get_partition(tender_id)
+        if not self.is_leased():
+            # owners are unknown, the partition may be taken over by another replica already
+            self.skip(tender_id, partition, date_modified)
+            return False
+        if partition in self.owned:
+            self.processed.append(tender_id)
+            return True
+        # partitions without a live owner are processed to not miss their tenders
+        if partition not in self.owners:
+            return True
+        self.skip(tender_id, partition, date_modified)
+        return False
+
+    def skip(self, tender_id: str, partition: int, date_modified: Optional[str]) -> None:
+        FOREIGN_TENDERS.inc()
+        age = seconds_since(date_modified)
+        if age is None:
+            age = 0
+        if age >= self.handoff_ttl:
+            # the owner has had plenty of time to process it
+            return
+        expires = datetime.utcnow() + timedelta(seconds=self.handoff_ttl - age)
+        self.skipped.append((tender_id, partition, date_modified, expires))
+
+    async def save_skipped(self) -> None:
+        """
+        Records foreign tenders of the handled page to be handed over if their partition changes owner
+        """
+        if not self.skipped:
+            return
+        skipped, self.skipped = self.skipped, []
+        await get_database().handoff.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": tender_id},
+                    {"$set": {"partition": partition, "dateModified": date_modified, "expires": expires}},
+                    upsert=True,
+                )
+                for tender_id, partition, date_modified, expires in skipped
+            ],
+            ordered=False,
+        )
+
+    async def hand_over(self, partitions: list) -> None:
+        """
+        Re-queues tenders skipped by any replica before the partitions were taken over,
+        together with tenders left pending by their previous owners
+        """
+        database = get_database()
+        query = {"partition": {"$in": partitions}}
+        tender_ids = [
+            document["_id"] async for document in database.handoff.find(
+                query, sort=[("dateModified", -1)], limit=self.requeue_limit
+            )
+        ]
+        if len(tender_ids) >= self.requeue_limit:
+            dropped = await database.handoff.count_documents(query) - len(tender_ids)
+            if dropped > 0:
+                LOGGER.warning(f"Node {self.node_id} drops {dropped} skipped tenders over the re-queue limit")
+                await database.handoff.delete_many({**query, "_id": {"$nin": tender_ids}})
+        # saved as pending first, so they are resumed after a restart as well
+        for tender_id in tender_ids:
+            await database.pending.update_one(
+                {"_id": tender_id}, {"$set": self.get_pending_record(tender_id)}, upsert=True
+            )
+        if tender_ids:
+            await database.handoff.delete_many({"_id": {"$in": tender_ids}})
+            HANDED_OVER_TENDERS.inc(len(tender_ids))
+
+        pending_ids = [
+            document["_id"] async for document in database.pending.find({**query, "node": {"$ne": self.node_id}})
+        ]
+        if pending_ids:
+            await database.pending.update_many({"_id": {"$in": pending_ids}}, {"$set": {"node": self.node_id}})
+        if not tender_ids and not pending_ids:
+            return
+        LOGGER.info(
+            f"Node {self.node_id} took over {len(tender_ids)} skipped and {len(pending_ids)} pending tenders "
+            f"of partitions {partitions}"
+        )
+        if self.requeue is not None:
+            for tender_id in tender_ids + pending_ids:
+                asyncio.ensure_future(self.requeue(tender_id))
+
+    async def heartbeat(self) -> None:
+        database = get_database()
+        now = time.time()
+        expires = now + self.lease_ttl
+        await database.nodes.update_one({"_id": self.node_id}, {"$set": {"expires": expires}}, upsert=True)
+        live_nodes = await database.nodes.count_documents({"expires": {"$gt": now}})
+        fair_share = ceil(self.partitions / max(live_nodes, 1))
+
+        for partition in list(self.owned):
+            result = await database.leases.update_one(
+                {"_id": partition, "owner": self.node_id},
+                {"$set": {"expires": expires}},
+            )
+            if not result.matched_count:
+                self.owned.discard(partition)
+
+        while len(self.owned) > fair_share:
+            partition = self.owned.pop()
+            await database.leases.update_one({"_id": partition, "owner": self.node_id}, {"$set": {"expires": 0}})
+
+        processed = self.processed_before + self.processed
+        self.processed_before, self.processed = self.processed, []
+        if processed:
+            await database.handoff.delete_many({"_id": {"$in": processed}})
+
+        owners = {}
+        async for lease in database.leases.find({"expires": {"$gt": now}}):
+            owners[lease["_id"]] = lease["owner"]
+
+        for partition in range(self.partitions):
+            if len(self.owned) >= fair_share:
+                break
+            if partition in owners:
+                continue
+            try:
+                result = await database.leases.update_one(
+                    {"_id": partition, "expires": {"$lte": now}},
+                    {"$set": {"owner": self.node_id, "expires": expires}},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                # taken by another replica in the meantime
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                self.owned.add(partition)
+                owners[partition] = self.node_id
+                self.taken_over.add(partition)
+
+        self.owners = owners
+        self.renewed_at = time.monotonic()
+        # released partitions don't need it anymore, their new owner hands them over
+        self.taken_over &= self.owned
+        if self.taken_over:
+            await self.hand_over(sorted(self.taken_over))
+            self.taken_over.clear()
+        OWNED_PARTITIONS.set(len(self.owned))
+        LIVE_NODES.set(live_nodes)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                LOGGER.warning(f"Coordination heartbeat failed. Exception: {type(e)} {e}")
+                if self.owned and not self.is_leased():
+                    LOGGER.warning(f"Node {self.node_id} leases expired, releasing {len(self.owned)} partitions")
+                    self.owned.clear()
+                    self.owners = {}
+                    self.taken_over.clear()
+                    OWNED_PARTITIONS.set(0)
+
+    async def start(self, requeue: Optional[Callable[[str], Awaitable]] = None) -> None:
+        if self.task is not None:
+            return
+        self.requeue = requeue
+        try:
+            await get_database().handoff.create_index("expires", expireAfterSeconds=0)
+        except Exception as e:
+            LOGGER.warning(f"Can't create handoff expiration index. Exception: {type(e)} {e}")
+        try:
+            await self.heartbeat()
+        except Exception as e:
+            LOGGER.warning(f"Coordination heartbeat failed. Exception: {type(e)} {e}")
+        LOGGER.info(f"Node {self.node_id} leased {len(self.owned)} of {self.partitions} partitions")
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        database = get_database()
+        await database.leases.update_many({"owner": self.node_id}, {"$set": {"expires": 0}})
+        await database.nodes.delete_one({"_id": self.node_id})
+        self.owned.clear()
+
+
+COORDINATOR = Coordinator(NODE_ID, COORDINATION_PARTITIONS, LEASE_TTL, HEARTBEAT_INTERVAL)
+
+
+async def start_coordination(requeue: Optional[Callable[[str], Awaitable]] = None) -> None:
+    if COORDINATION:
+        await COORDINATOR.start(requeue)
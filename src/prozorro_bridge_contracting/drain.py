@@ -0,0 +1,160 @@
+from aiohttp import ClientSession
+from contextlib import asynccontextmanager
+import asyncio
+import signal
+
+from prozorro_bridge_contracting.bridge import run_with_deadline
+from prozorro_bridge_contracting.checkpoint import CHECKPOINTER
+from prozorro_bridge_contracting.coordination import COORDINATOR
+from prozorro_bridge_contracting.hedging import HEDGER
+from prozorro_bridge_contracting.inflight import TENDERS_IN_FLIGHT
+from prozorro_bridge_contracting.introspection import track, record_error
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.scheduler import SCHEDULER, BACKLOG_LANE
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    COORDINATION,
+    DRAIN_TIMEOUT,
+    TENDER_DEADLINE,
+    ERROR_INTERVAL,
+)
+from prozorro_bridge_contracting.single import sync_single_tender
+from prozorro_bridge_contracting.storage import get_database
+
+
+class GracefulDrain:
+    """
+    Stops the bridge on SIGTERM/SIGINT without rework after restart:
+    new feed pages and tenders are not started, the current pages get DRAIN_TIMEOUT seconds to finish,
+    tenders still in flight, parked or not started are saved to mongodb and resumed on the next start
+    (with coordination, by the replica that leases their partition),
+    and the feed position after the last handled page is checkpointed before the loop is stopped.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.draining = False
+        self.drained = False
+        self.installed = False
+        # task lists of the pages being handled, the crawler handles forward and backward pages concurrently
+        self.pages = []
+        self.page_done = None
+        self.blocked = None
+
+    def install(self, session: ClientSession) -> None:
+        if self.installed:
+            return
+        self.installed = True
+        self.page_done = asyncio.Event()
+        self.page_done.set()
+        self.blocked = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.start)
+        asyncio.ensure_future(self.resume(session))
+
+    @asynccontextmanager
+    async def page(self, tasks: list):
+        self.pages.append(tasks)
+        self.page_done.clear()
+        try:
+            yield
+        finally:
+            self.pages.remove(tasks)
+            if not self.pages:
+                self.page_done.set()
+
+    async def save_unstarted(self, scheduled: list) -> None:
+        """
+        Saves (tender id, coroutine) pairs of the page not started before the drain, to be resumed after restart
+        """
+        for _, coroutine in scheduled:
+            coroutine.close()
+        await self.save_pending([tender_id for tender_id, _ in scheduled])
+
+    async def block(self) -> None:
+        """
+        Holds the crawler after the last page was handled (and its position saved) until the loop is stopped
+        """
+        self.blocked.set()
+        await asyncio.Event().wait()
+
+    def start(self) -> None:
+        if self.draining:
+            return
+        LOGGER.info(f"Draining before shutdown, in flight work has {self.timeout} seconds to finish")
+        self.draining = True
+        asyncio.ensure_future(self.drain())
+
+    async def drain(self) -> None:
+        loop = asyncio.get_event_loop()
+        try:
+            try:
+                await asyncio.wait_for(self.page_done.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                await self.save_pending(list(TENDERS_IN_FLIGHT.running))
+                for tasks in self.pages:
+                    for task in tasks:
+                        task.cancel()
+            # the crawler saves the position of the handled page before it asks for the next one
+            try:
+                await asyncio.wait_for(self.blocked.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                LOGGER.warning("Crawler didn't request the next page in time")
+
+            await self.save_pending([items[0].tender_id for items in PARKING.parked.values() if items])
+            for task in list(PARKING.parked):
+                task.cancel()
+            await CHECKPOINTER.flush()
+            await COORDINATOR.stop()
+            await HEDGER.close()
+        except Exception as e:
+            LOGGER.exception(e)
+        finally:
+            self.drained = True
+            LOGGER.info("Drained, stopping")
+            loop.stop()
+
+    async def save_pending(self, tender_ids: list) -> None:
+        if not tender_ids:
+            return
+        LOGGER.info(f"Saving {len(tender_ids)} unfinished tenders to resume after restart")
+        collection = get_database().pending
+        for tender_id in set(tender_ids):
+            await collection.update_one(
+                {"_id": tender_id}, {"$set": COORDINATOR.get_pending_record(tender_id)}, upsert=True
+            )
+
+    async def resume(self, session: ClientSession) -> None:
+        if COORDINATION:
+            # pending tenders of a partition are resumed by the replica that leases it
+            return
+        collection = get_database().pending
+        try:
+            tender_ids = [document["_id"] async for document in collection.find()]
+        except Exception as e:
+            LOGGER.warning(f"Can't load unfinished tenders. Exception: {type(e)} {e}")
+            return
+        if tender_ids:
+            LOGGER.info(f"Resuming {len(tender_ids)} unfinished tenders")
+        await asyncio.gather(*(self.resume_tender(tender_id, session) for tender_id in tender_ids))
+
+    async def resume_tender(self, tender_id: str, session: ClientSession) -> None:
+        while True:
+            with track("resumed tender", tender_id):
+                try:
+                    async with SCHEDULER.slot(BACKLOG_LANE):
+                        await run_with_deadline(sync_single_tender(tender_id, session), TENDER_DEADLINE, "tender")
+                except ValueError as e:
+                    # the api rejected the contract, there is no point to retry
+                    LOGGER.error(f"ATTENTION! Unfinished tender {tender_id} won't be resumed. Exception: {e}")
+                except Exception as e:
+                    LOGGER.warning(f"Fail to resume tender {tender_id}. Exception: {type(e)} {e}")
+                    record_error(e, "retry sleep")
+                    await asyncio.sleep(ERROR_INTERVAL)
+                    continue
+            await get_database().pending.delete_one({"_id": tender_id})
+            return
+
+
+DRAIN = GracefulDrain(DRAIN_TIMEOUT)
@@ -0,0 +1,137 @@
+from aiohttp import ClientSession, ClientResponse, DummyCookieJar
+from collections import deque
+from typing import Optional, Tuple
+import asyncio
+
+from prozorro_bridge_contracting.metrics import Counter
+from prozorro_bridge_contracting.settings import (
+    HEDGE_REQUESTS,
+    HEDGE_PERCENTILE,
+    HEDGE_WINDOW,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_BUDGET,
+    HEDGE_BURST,
+    HEDGE_OTHER_BACKEND,
+)
+
+
+HEDGEABLE_REQUESTS = Counter(
+    "contracting_bridge_hedgeable_requests_total",
+    "Idempotent api reads that could be hedged, by endpoint",
+)
+HEDGED_REQUESTS = Counter(
+    "contracting_bridge_hedged_requests_total",
+    "Duplicate api reads sent after the hedge delay (sent) and the ones that answered first (won), by endpoint",
+)
+
+
+class Hedger:
+    """
+    Sends a duplicate of a slow idempotent read after the `percentile` latency of the endpoint,
+    the first successful answer wins and the other request is cancelled.
+    Every request adds `budget` hedge tokens (up to `burst`) and every hedge takes one,
+    so hedges add at most `budget` share of extra requests.
+    With `other_backend` hedges are sent without the SERVER_ID cookie, so they may land on another backend.
+    """
+
+    def __init__(
+        self, enabled: bool, percentile: float, window: int, min_samples: int,
+        budget: float, burst: float, other_backend: bool,
+    ) -> None:
+        self.enabled = enabled
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.budget = budget
+        self.burst = burst
+        self.other_backend = other_backend
+        self.latencies = {}
+        self.tokens = 0.0
+        self.session = None
+
+    def get_delay(self, endpoint: str) -> Optional[float]:
+        latencies = self.latencies.get(endpoint)
+        if not latencies or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)]
+
+    def observe(self, endpoint: str, latency: float) -> None:
+        if endpoint not in self.latencies:
+            self.latencies[endpoint] = deque(maxlen=self.window)
+        self.latencies[endpoint].append(latency)
+
+    def take_token(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def get_hedge_session(self, session: ClientSession) -> ClientSession:
+        if not self.other_backend:
+            return session
+        if self.session is None or self.session.closed:
+            self.session = ClientSession(cookie_jar=DummyCookieJar())
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    @staticmethod
+    async def send(session: ClientSession, method: str, url: str, read: bool, **kwargs) -> Tuple[ClientResponse, str]:
+        response = await getattr(session, method)(url, **kwargs)
+        data = await response.text() if read else ""
+        return response, data
+
+    async def request(
+        self, endpoint: str, session: ClientSession, method: str, url: str, read: bool = True, **kwargs
+    ) -> Tuple[ClientResponse, str]:
+        """
+        Returns the response and its text (empty if not `read`) of the first successful request
+        """
+        if not self.enabled:
+            return await self.send(session, method, url, read, **kwargs)
+
+        HEDGEABLE_REQUESTS.inc(endpoint=endpoint)
+        self.tokens = min(self.tokens + self.budget, self.burst)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        primary = asyncio.ensure_future(self.send(session, method, url, read, **kwargs))
+        tasks = [primary]
+        winner = None
+        try:
+            delay = self.get_delay(endpoint)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self.take_token():
+                    HEDGED_REQUESTS.inc(endpoint=endpoint, outcome="sent")
+                    hedge_session = self.get_hedge_session(session)
+                    tasks.append(asyncio.ensure_future(self.send(hedge_session, method, url, read, **kwargs)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and task.exception() is None:
+                        winner = task
+                        break
+                if winner is not None:
+                    break
+            if winner is None:
+                raise primary.exception()
+            self.observe(endpoint, loop.time() - started)
+            if winner is not primary:
+                HEDGED_REQUESTS.inc(endpoint=endpoint, outcome="won")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None:
+                    response, _ = task.result()
+                    response.release()
+
+
+HEDGER = Hedger(
+    HEDGE_REQUESTS, HEDGE_PERCENTILE, HEDGE_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_BUDGET, HEDGE_BURST, HEDGE_OTHER_BACKEND
+)
@@ -0,0 +1,123 @@
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+
+from prozorro_bridge_contracting.metrics import Counter, Gauge
+
+
+INFLIGHT_DEDUP = Counter(
+    "contracting_bridge_inflight_dedup_total",
+    "Sightings of tenders and contracts that were already in flight (attached or superseding)",
+)
+INFLIGHT = Gauge(
+    "contracting_bridge_inflight",
+    "Tenders and contracts currently in flight",
+)
+
+
+class Entry:
+    __slots__ = ("version", "future", "successor")
+
+    def __init__(self, version: Optional[str]) -> None:
+        self.version = version
+        self.future = asyncio.get_event_loop().create_future()
+        self.successor = None
+
+
+def _is_newer(version: Optional[str], than: Optional[str]) -> bool:
+    return version is not None and than is not None and version > than
+
+
+def _cancelled(future: asyncio.Future, key: str) -> None:
+    # waiters shouldn't be cancelled together with the work they attached to, they retry it instead
+    if not future.done():
+        future.set_exception(ConnectionError(f"In flight work for {key} was cancelled"))
+        future.exception()
+
+
+def _chain(source: asyncio.Future, target: asyncio.Future) -> None:
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class InFlightRegistry:
+    """
+    Process-wide registry of running work keyed by tender or contract id.
+
+    A repeated sighting of a key that is already running attaches to the running work
+    and gets its result. A sighting with a newer version (tender dateModified)
+    supersedes: it waits for the running work and then runs itself,
+    older waiting sightings attach to it instead of running too.
+    """
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.running = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.running
+
+    async def run(self, key: str, version: Optional[str], factory: Callable[[], Awaitable]) -> Any:
+        entry = self.running.get(key)
+        if entry is None:
+            return await self._execute(key, Entry(version), factory)
+
+        latest = entry.successor or entry
+        if not _is_newer(version, latest.version):
+            INFLIGHT_DEDUP.inc(kind=self.kind, action="attach")
+            return await asyncio.shield(latest.future)
+
+        INFLIGHT_DEDUP.inc(kind=self.kind, action="supersede")
+        successor = Entry(version)
+        if entry.successor is not None:
+            previous = entry.successor
+            successor.future.add_done_callback(lambda f: _chain(f, previous.future))
+        entry.successor = successor
+        try:
+            await asyncio.shield(entry.future)
+        except asyncio.CancelledError:
+            if entry.successor is successor:
+                entry.successor = None
+            if self.running.get(key) is successor:
+                del self.running[key]
+            _cancelled(successor.future, key)
+            raise
+        except Exception:
+            pass
+        if entry.successor is not successor:
+            return await asyncio.shield(successor.future)
+        return await self._execute(key, successor, factory)
+
+    async def _execute(self, key: str, entry: Entry, factory: Callable[[], Awaitable]) -> Any:
+        self.running[key] = entry
+        INFLIGHT.set(len(self.running), kind=self.kind)
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            _cancelled(entry.future, key)
+            raise
+        except Exception as e:
+            entry.future.set_exception(e)
+            # waiters get the exception, don't warn about it if there are none
+            entry.future.exception()
+            raise
+        else:
+            entry.future.set_result(result)
+            return result
+        finally:
+            if self.running.get(key) is entry:
+                if entry.successor is not None:
+                    # keep the key busy until the superseding sighting starts
+                    self.running[key] = entry.successor
+                else:
+                    del self.running[key]
+            INFLIGHT.set(len(self.running), kind=self.kind)
+
+
+TENDERS_IN_FLIGHT = InFlightRegistry("tender")
+CONTRACTS_IN_FLIGHT = InFlightRegistry("contract")
@@ -0,0 +1,129 @@
+from aiohttp import ClientSession
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import asyncio
+import json
+import signal
+import time
+
+from prozorro_bridge_contracting.backpressure import BACKPRESSURE, get_rss
+from prozorro_bridge_contracting.hedging import HEDGER
+from prozorro_bridge_contracting.inflight import TENDERS_IN_FLIGHT, CONTRACTS_IN_FLIGHT
+from prozorro_bridge_contracting.journal_msg_ids import DATABRIDGE_SNAPSHOT
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.scheduler import SCHEDULER
+from prozorro_bridge_contracting.settings import LOGGER
+from prozorro_bridge_contracting.utils import journal_context
+
+
+class Activity:
+    """
+    What a tender or contract coroutine is doing at the moment, updated in place,
+    so tracking costs a few attribute writes per stage and nothing until a snapshot is taken.
+    """
+    __slots__ = ("kind", "key", "stage", "started", "stage_started", "attempts", "last_error")
+
+    def __init__(self, kind: str, key: str) -> None:
+        self.kind = kind
+        self.key = key
+        self.stage = "started"
+        self.started = self.stage_started = time.monotonic()
+        self.attempts = 0
+        self.last_error = None
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            "kind": self.kind,
+            "id": self.key,
+            "stage": self.stage,
+            "seconds_in_stage": round(now - self.stage_started, 3),
+            "seconds_in_flight": round(now - self.started, 3),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+        }
+
+
+current_activity: ContextVar = ContextVar("current_activity", default=None)
+activities = set()
+signal_installed = False
+
+
+@contextmanager
+def track(kind: str, key: str):
+    activity = Activity(kind, key)
+    activities.add(activity)
+    token = current_activity.set(activity)
+    try:
+        yield activity
+    finally:
+        current_activity.reset(token)
+        activities.discard(activity)
+
+
+def set_stage(stage: str) -> None:
+    activity = current_activity.get()
+    if activity is not None:
+        activity.stage = stage
+        activity.stage_started = time.monotonic()
+
+
+def record_error(error: Exception, stage: str = "backoff") -> None:
+    activity = current_activity.get()
+    if activity is not None:
+        activity.attempts += 1
+        activity.last_error = f"{type(error).__name__}: {error}"
+        activity.stage = stage
+        activity.stage_started = time.monotonic()
+
+
+def get_pool_stats(session: Optional[ClientSession]) -> Optional[dict]:
+    if session is None or session.closed or session.connector is None:
+        return None
+    connector = session.connector
+    return {
+        "limit": connector.limit,
+        "limit_per_host": connector.limit_per_host,
+        "acquired": len(getattr(connector, "_acquired", ())),
+        "idle": sum(len(connections) for connections in getattr(connector, "_conns", {}).values()),
+    }
+
+
+def take_snapshot(session: ClientSession = None) -> dict:
+    now = time.monotonic()
+    return {
+        "activities": sorted(
+            (activity.as_dict(now) for activity in list(activities)),
+            key=lambda activity: -activity["seconds_in_flight"],
+        ),
+        "in_flight": {"tenders": len(TENDERS_IN_FLIGHT.running), "contracts": len(CONTRACTS_IN_FLIGHT.running)},
+        "scheduler": SCHEDULER.stats(),
+        "parked": len(PARKING),
+        "pending": {
+            "tenders": BACKPRESSURE.tenders,
+            "contracts": BACKPRESSURE.contracts,
+            "bytes": BACKPRESSURE.size,
+            "intake_paused": BACKPRESSURE.paused,
+        },
+        "rss": get_rss(),
+        "connection_pool": get_pool_stats(session),
+        "hedge_connection_pool": get_pool_stats(HEDGER.session),
+    }
+
+
+def log_snapshot(session: ClientSession = None) -> None:
+    LOGGER.info(
+        f"Snapshot: {json.dumps(take_snapshot(session))}",
+        extra=journal_context({"MESSAGE_ID": DATABRIDGE_SNAPSHOT}),
+    )
+
+
+def install_snapshot_signal(session: ClientSession) -> None:
+    """
+    `kill -USR1 <pid>` logs a snapshot of in flight work
+    """
+    global signal_installed
+    if signal_installed:
+        return
+    signal_installed = True
+    asyncio.get_event_loop().add_signal_handler(signal.SIGUSR1, log_snapshot, session)
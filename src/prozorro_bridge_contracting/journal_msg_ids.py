@@ -10,3 +10,6 @@ DATABRIDGE_CREATE_CONTRACT = "c_bridge_create_contract"
 DATABRIDGE_CONTRACT_CREATED = "c_bridge_contract_created"
 DATABRIDGE_EXCEPTION = "c_bridge_exception"
 DATABRIDGE_INFO = "c_bridge_info"
+DATABRIDGE_LOG_SUMMARY = "c_bridge_log_summary"
+DATABRIDGE_SNAPSHOT = "c_bridge_snapshot"
+DATABRIDGE_INVALID_CONTRACT = "c_bridge_invalid_contract"
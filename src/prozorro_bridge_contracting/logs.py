@@ -0,0 +1,83 @@
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+import atexit
+import logging
+from typing import Callable
+import time
+
+from prozorro_bridge_contracting.journal_msg_ids import DATABRIDGE_LOG_SUMMARY
+
+
+class AggregatingQueueHandler(QueueHandler):
+    """
+    Puts records to a queue as they are, formatting and I/O happen in the listener thread.
+    Records with MESSAGE_ID from `aggregate_ids` are not emitted one by one,
+    their counts are emitted once per `interval` seconds instead.
+    """
+
+    def __init__(self, queue, aggregate_ids: tuple = (), interval: float = 60) -> None:
+        super().__init__(queue)
+        self.aggregate_ids = frozenset(aggregate_ids)
+        self.interval = interval
+        self.counts = Counter()
+        self.flushed_at = time.monotonic()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if getattr(record, "MESSAGE_ID", None) in self.aggregate_ids:
+            self.counts[record.MESSAGE_ID] += 1
+        else:
+            super().emit(record)
+        if time.monotonic() - self.flushed_at >= self.interval:
+            self.flush_counts(record.name)
+
+    def flush_counts(self, name: str) -> None:
+        self.flushed_at = time.monotonic()
+        if not self.counts:
+            return
+        counts = ", ".join(f"{message_id}={count}" for message_id, count in sorted(self.counts.items()))
+        self.counts.clear()
+        record = logging.makeLogRecord({
+            "name": name,
+            "levelno": logging.INFO,
+            "levelname": logging.getLevelName(logging.INFO),
+            "msg": f"Aggregated log messages: {counts}",
+            "MESSAGE_ID": DATABRIDGE_LOG_SUMMARY,
+        })
+        super().emit(record)
+
+
+def install_queue_logging(logger: logging.Logger, aggregate_ids: tuple = (), interval: float = 60) -> Callable:
+    """
+    Moves handlers of the logger (or the root logger if it has none) behind a queue
+    so log writes don't block the event loop.
+    Returns a function that flushes the queue and stops the listener (also called at exit).
+    Nothing is installed while no handlers are configured, a listener without handlers would drop
+    every record and a later logging.basicConfig would be a no-op.
+    """
+    target = logger if logger.handlers else logging.getLogger()
+    if not target.handlers:
+        return lambda: None
+    queue = SimpleQueue()
+    handler = AggregatingQueueHandler(queue, aggregate_ids, interval)
+    listener = QueueListener(queue, *target.handlers, respect_handler_level=True)
+    target.handlers = [handler]
+    listener.start()
+    running = [True]
+
+    def stop() -> None:
+        if not running:
+            return
+        running.clear()
+        handler.acquire()
+        try:
+            handler.flush_counts(logger.name)
+        finally:
+            handler.release()
+        listener.stop()
+
+    atexit.register(stop)
+    return stop
@@ -5,9 +5,27 @@ import sentry_sdk
 from sentry_sdk.integrations.aiohttp import AioHttpIntegration
 from prozorro_crawler.main import main
 
-from prozorro_bridge_contracting.bridge import process_listing
+from prozorro_bridge_contracting.backpressure import BACKPRESSURE
+from prozorro_bridge_contracting.bridge import schedule_listing
+from prozorro_bridge_contracting.catchup import CATCH_UP, FEED_HEAD
+from prozorro_bridge_contracting.checkpoint import CHECKPOINTER, install_checkpointing
+from prozorro_bridge_contracting.coordination import COORDINATOR, start_coordination
+from prozorro_bridge_contracting.drain import DRAIN
+from prozorro_bridge_contracting.introspection import install_snapshot_signal
+from prozorro_bridge_contracting.metrics import FEED_LAG
+from prozorro_bridge_contracting.prefilter import prefilter
+from prozorro_bridge_contracting.scheduler import LANES, get_lane
+from prozorro_bridge_contracting.server import start_server
 from prozorro_bridge_contracting.single import sync_single_tender
-from prozorro_bridge_contracting.settings import SENTRY_DSN
+from prozorro_bridge_contracting.logs import install_queue_logging
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    SENTRY_DSN,
+    FEED_MODE,
+    LOG_QUEUE,
+    LOG_AGGREGATE_MESSAGE_IDS,
+    LOG_AGGREGATE_INTERVAL,
+)
 
 
 API_OPT_FIELDS = (
@@ -19,19 +37,77 @@ API_OPT_FIELDS = (
     "mode",
 )
 
+# light feed mode doesn't request procuringEntity and lots for every tender,
+# full tenders are fetched only for contracts that have to be created
+LIGHT_API_OPT_FIELDS = (
+    "status",
+    "contracts",
+    "procurementMethodType",
+    "mode",
+)
+
 
 async def data_handler(session: ClientSession, items: list) -> None:
+    # the crawler doesn't read the next page while intake is paused
+    await BACKPRESSURE.wait(lambda: DRAIN.draining)
+    if DRAIN.draining:
+        # the page is not handled, so the crawler doesn't move the feed position past it
+        await DRAIN.block()
+    DRAIN.install(session)
+    install_snapshot_signal(session)
+    await start_server(session)
+    # tenders skipped before their partition was taken over are synced like resumed ones
+    await start_coordination(lambda tender_id: DRAIN.resume_tender(tender_id, session))
+    # a replica without its leases doesn't know which tenders are its own
+    await COORDINATOR.wait_leased(lambda: DRAIN.draining)
+    if DRAIN.draining:
+        await DRAIN.block()
+    # lag of the forward feed, pages of the backward crawler are hours old during an initial sync
+    feed_lag = FEED_HEAD.get_lag(items)
+    if feed_lag is not None:
+        FEED_LAG.set(max(feed_lag, 0))
+        CATCH_UP.update(feed_lag)
+    lanes = {lane: [] for lane in LANES}
+    # most feed tenders are rejected here, without coroutines and scheduling
+    for item in prefilter(items):
+        if not COORDINATOR.owns(item["id"], item.get("dateModified")):
+            continue
+        lane = get_lane(item)
+        coroutine = schedule_listing(session, item, lane)
+        if coroutine is not None:
+            lanes[lane].append((item["id"], coroutine))
+    try:
+        await COORDINATOR.save_skipped()
+    except Exception as e:
+        LOGGER.warning(f"Can't save skipped tenders for handoff. Exception: {type(e)} {e}")
+    # scheduled coroutines hold compact contract work items only, so the page is released by the crawler
+    # once the handler returns, even if some of its tenders are still parked; the crawler owns the list,
+    # so it isn't mutated here
+    # coroutines of higher priority lanes are started first
+    scheduled = [pair for lane in LANES for pair in lanes[lane]]
     process_items_tasks = []
-    for item in items:
-        coroutine = process_listing(session, item)
-        process_items_tasks.append(coroutine)
-    await asyncio.gather(*process_items_tasks)
+    async with DRAIN.page(process_items_tasks):
+        for index, (_, coroutine) in enumerate(scheduled):
+            # an oversized page is started in parts, as its pending work drains below the watermarks
+            await BACKPRESSURE.admit(lambda: DRAIN.draining)
+            if DRAIN.draining:
+                # no new work is started on shutdown, the rest of the page is resumed after restart
+                await DRAIN.save_unstarted(scheduled[index:])
+                break
+            process_items_tasks.append(asyncio.ensure_future(coroutine))
+        # tasks cancelled by the drain on shutdown are saved to be resumed after restart
+        results = await asyncio.gather(*process_items_tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            LOGGER.exception(result, exc_info=result)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Contracting Data Bridge")
     parser.add_argument("--tender", type=str, help="Tender id to sync", dest="tender_id")
     params = parser.parse_args()
+    if LOG_QUEUE:
+        install_queue_logging(LOGGER, LOG_AGGREGATE_MESSAGE_IDS, LOG_AGGREGATE_INTERVAL)
     if SENTRY_DSN:
         sentry_sdk.init(
             dsn=SENTRY_DSN,
@@ -41,4 +117,12 @@ if __name__ == "__main__":
         loop = asyncio.get_event_loop()
         loop.run_until_complete(sync_single_tender(tender_id=params.tender_id))
     else:
-        main(data_handler, opt_fields=API_OPT_FIELDS)
+        install_checkpointing()
+        try:
+            main(data_handler, opt_fields=LIGHT_API_OPT_FIELDS if FEED_MODE == "light" else API_OPT_FIELDS)
+        except RuntimeError:
+            # the drain stops the loop the crawler runs in
+            if not DRAIN.drained:
+                raise
+        else:
+            asyncio.get_event_loop().run_until_complete(CHECKPOINTER.flush())
@@ -0,0 +1,115 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+
+def _labels_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: dict = None) -> str:
+    pairs = list(key)
+    if extra:
+        pairs.extend(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        REGISTRY[name] = self
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.type}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        super().__init__(name, description)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_labels_key(labels), 0)
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, value in self.values.items():
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.values[_labels_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float]) -> None:
+        super().__init__(name, description)
+        self.buckets = sorted(buckets)
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels_key(labels)
+        if key not in self.values:
+            # per-bucket counts, then an overflow slot, sum and total count
+            self.values[key] = [0] * (len(self.buckets) + 1) + [0, 0]
+        data = self.values[key]
+        data[bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def get_count(self, **labels) -> int:
+        data = self.values.get(_labels_key(labels))
+        return data[-1] if data else 0
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        for key, data in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {data[-1]}"
+            yield f"{self.name}_sum{_format_labels(key)} {data[-2]}"
+            yield f"{self.name}_count{_format_labels(key)} {data[-1]}"
+
+
+REGISTRY: Dict[str, Metric] = {}
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+LAG_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 3 * 3600, 12 * 3600, 24 * 3600)
+
+CONTRACT_SYNC_LAG = Histogram(
+    "contracting_bridge_contract_sync_lag_seconds",
+    "Delay between contract activation (or tender dateModified) and its creation in contracting",
+    LAG_BUCKETS,
+)
+FEED_LAG = Gauge(
+    "contracting_bridge_feed_lag_seconds",
+    "How far behind real time the newest tender seen in the feed is",
+)
@@ -0,0 +1,101 @@
+from contextvars import ContextVar
+from typing import Coroutine
+import asyncio
+import time
+
+from prozorro_bridge_contracting.metrics import Counter, Gauge
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    PARKING_LIMIT,
+    PARK_AFTER_ATTEMPTS,
+    PARK_AFTER_SECONDS,
+)
+
+
+PARKED = Gauge(
+    "contracting_bridge_parked_tenders",
+    "Tenders whose contracts are retried in the background parking lane",
+)
+PARKING_EVENTS = Counter(
+    "contracting_bridge_parking_total",
+    "Parking lane events (parked, drained, rejected when the lane is full)",
+)
+
+
+class ParkTender(Exception):
+    """
+    Raised from retry loops of a tender that has been failing long enough to be parked
+    """
+
+
+class RetryBudget:
+    __slots__ = ("started", "attempts")
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.attempts = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+# retries of the feed tender being processed, None in parked and on-demand work that is never parked
+retry_budget: ContextVar = ContextVar("retry_budget", default=None)
+
+
+class ParkingLane:
+    """
+    Background retry pool for tenders that keep failing,
+    so a single stuck tender doesn't hold the rest of its feed page.
+    """
+
+    def __init__(self, limit: int, after_attempts: int, after_seconds: float) -> None:
+        self.limit = limit
+        self.after_attempts = after_attempts
+        self.after_seconds = after_seconds
+        # parked task -> contract work items it has left
+        self.parked = {}
+
+    def __len__(self) -> int:
+        return len(self.parked)
+
+    def should_park(self, attempts: int, elapsed: float) -> bool:
+        return attempts >= self.after_attempts or elapsed >= self.after_seconds
+
+    def check_retry(self) -> None:
+        """
+        Counts a retry of the current tender, the inner retry loops (credentials, POST) never give up
+        on their own, so they are interrupted with ParkTender once the tender should be parked
+        """
+        budget = retry_budget.get()
+        if budget is None:
+            return
+        budget.attempts += 1
+        if self.should_park(budget.attempts, budget.elapsed):
+            raise ParkTender(f"Failed {budget.attempts} times in {budget.elapsed:.0f} seconds")
+
+    def park(self, items: list, coroutine: Coroutine) -> bool:
+        if len(self.parked) >= self.limit:
+            PARKING_EVENTS.inc(event="rejected")
+            coroutine.close()
+            return False
+        task = asyncio.ensure_future(coroutine)
+        self.parked[task] = items
+        task.add_done_callback(self._drained)
+        PARKING_EVENTS.inc(event="parked")
+        PARKED.set(len(self.parked))
+        return True
+
+    def _drained(self, task: asyncio.Task) -> None:
+        self.parked.pop(task, None)
+        PARKED.set(len(self.parked))
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            LOGGER.warning(f"Parked tender failed. Exception: {type(task.exception())} {task.exception()}")
+        else:
+            PARKING_EVENTS.inc(event="drained")
+
+
+PARKING = ParkingLane(PARKING_LIMIT, PARK_AFTER_ATTEMPTS, PARK_AFTER_SECONDS)
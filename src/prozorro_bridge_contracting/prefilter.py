@@ -0,0 +1,41 @@
+from typing import Optional
+
+from prozorro_bridge_contracting.metrics import Counter
+from prozorro_bridge_contracting.settings import (
+    EXCLUDED_PROCUREMENT_METHOD_TYPES,
+    EXCLUDED_MODES,
+    REQUIRED_CONTRACT_STATUSES,
+)
+
+
+REJECTED_TENDERS = Counter(
+    "contracting_bridge_feed_rejected_total",
+    "Feed tenders rejected by the prefilter before scheduling, by rule",
+)
+
+
+def get_rejection_rule(tender: dict) -> Optional[str]:
+    """
+    Returns the name of the first rule the feed tender fails or None if the tender has to be processed
+    """
+    if tender.get("procurementMethodType") in EXCLUDED_PROCUREMENT_METHOD_TYPES:
+        return "procurement_method_type"
+    if tender.get("mode") in EXCLUDED_MODES:
+        return "mode"
+    if not any(contract.get("status") in REQUIRED_CONTRACT_STATUSES for contract in tender.get("contracts", [])):
+        return "contract_status"
+    return None
+
+
+def prefilter(items: list) -> list:
+    """
+    Returns feed items that pass all rules, so no coroutines are created for the rest of the page
+    """
+    accepted = []
+    for item in items:
+        rule = get_rejection_rule(item)
+        if rule is None:
+            accepted.append(item)
+        else:
+            REJECTED_TENDERS.inc(rule=rule)
+    return accepted
@@ -0,0 +1,151 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+
+from prozorro_bridge_contracting.metrics import Gauge
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.settings import (
+    FRESH_CONCURRENCY,
+    BACKLOG_CONCURRENCY,
+    RETRY_CONCURRENCY,
+    FRESH_CONTRACT_PERIOD,
+)
+from prozorro_bridge_contracting.utils import seconds_since
+
+
+FRESH_LANE = "fresh"
+BACKLOG_LANE = "backlog"
+RETRY_LANE = "retry"
+
+LANES = (FRESH_LANE, BACKLOG_LANE, RETRY_LANE)
+
+LANE_SLOTS = Gauge(
+    "contracting_bridge_lane_slots",
+    "Scheduler slots per priority lane by state (active, waiting, limit)",
+)
+
+
+class Lane:
+    """
+    Concurrency limiter of a single priority lane.
+    Freed slots are handed over to waiters in FIFO order and the limit can be changed at runtime.
+    """
+
+    def __init__(self, name: str, limit: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.waiters = deque()
+
+    def _report(self) -> None:
+        LANE_SLOTS.set(self.active, lane=self.name, state="active")
+        LANE_SLOTS.set(len(self.waiters), lane=self.name, state="waiting")
+        LANE_SLOTS.set(self.limit, lane=self.name, state="limit")
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self._report()
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self.waiters.append(waiter)
+        self._report()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot had been handed over right before cancellation
+                self.release()
+            elif waiter in self.waiters:
+                # a cancelled waiter may have been already popped by _wake
+                self.waiters.remove(waiter)
+                self._report()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters and self.active < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+        self._report()
+
+
+class SlotHolder:
+    __slots__ = ("lane",)
+
+    def __init__(self, lane: Lane) -> None:
+        self.lane = lane
+
+
+current_slot: ContextVar = ContextVar("current_slot", default=None)
+
+
+class Scheduler:
+    def __init__(self, limits: dict) -> None:
+        self.lanes = {name: Lane(name, limit) for name, limit in limits.items()}
+
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        """
+        Holds a slot of the given lane while the block runs.
+        Retry sleeps made with `backoff` inside the block give the slot away
+        and continue in the retry lane afterwards.
+        """
+        holder = SlotHolder(self.lanes[lane])
+        await holder.lane.acquire()
+        token = current_slot.set(holder)
+        try:
+            yield holder
+        finally:
+            current_slot.reset(token)
+            if holder.lane is not None:
+                holder.lane.release()
+
+    async def backoff(self, delay: float) -> None:
+        """
+        Sleeps before a retry, raises ParkTender instead if the tender should be parked
+        """
+        PARKING.check_retry()
+        holder = current_slot.get()
+        if holder is None:
+            await asyncio.sleep(delay)
+            return
+        holder.lane.release()
+        holder.lane = None
+        await asyncio.sleep(delay)
+        lane = self.lanes[RETRY_LANE]
+        await lane.acquire()
+        holder.lane = lane
+
+    def stats(self) -> dict:
+        return {
+            name: {"active": lane.active, "waiting": len(lane.waiters), "limit": lane.limit}
+            for name, lane in self.lanes.items()
+        }
+
+
+def get_lane(tender: dict) -> str:
+    for contract in tender.get("contracts", []):
+        if contract.get("status") != "active":
+            continue
+        age = seconds_since(contract.get("date"))
+        if age is not None and age < FRESH_CONTRACT_PERIOD:
+            return FRESH_LANE
+    return BACKLOG_LANE
+
+
+SCHEDULER = Scheduler({
+    FRESH_LANE: FRESH_CONCURRENCY,
+    BACKLOG_LANE: BACKLOG_CONCURRENCY,
+    RETRY_LANE: RETRY_CONCURRENCY,
+})
@@ -0,0 +1,147 @@
+from aiohttp import ClientSession, web
+from collections import OrderedDict
+from hmac import compare_digest
+from ipaddress import ip_address
+from uuid import uuid4
+import asyncio
+
+from prozorro_bridge_contracting.bridge import run_with_deadline
+from prozorro_bridge_contracting.introspection import track, take_snapshot
+from prozorro_bridge_contracting.metrics import render_metrics
+from prozorro_bridge_contracting.scheduler import SCHEDULER, FRESH_LANE
+from prozorro_bridge_contracting.settings import (
+    LOGGER,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_TOKEN,
+    SYNC_JOBS_LIMIT,
+    TENDER_DEADLINE,
+)
+from prozorro_bridge_contracting.single import sync_single_tender
+
+
+routes = web.RouteTableDef()
+runner = None
+jobs = OrderedDict()
+# running job tasks, referenced until they are done
+job_tasks = set()
+
+
+def is_local(remote: str) -> bool:
+    try:
+        return ip_address(remote).is_loopback
+    except ValueError:
+        # unix socket peers have no address
+        return not remote
+
+
+def check_access(request: web.Request) -> None:
+    """
+    Raises 403 for state changing and introspection endpoints called by a remote client without the token
+    """
+    if SERVER_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if compare_digest(authorization.encode(), f"Bearer {SERVER_TOKEN}".encode()):
+            return
+    if is_local(request.remote or ""):
+        return
+    raise web.HTTPForbidden(text="Local clients or the SERVER_TOKEN bearer token only")
+
+
+@routes.get("/metrics")
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain")
+
+
+@routes.get("/snapshot")
+async def snapshot_view(request: web.Request) -> web.Response:
+    check_access(request)
+    return web.json_response(take_snapshot(request.app["session"]))
+
+
+async def sync_tender(tender_id: str, session: ClientSession) -> dict:
+    try:
+        with track("on-demand tender", tender_id):
+            async with SCHEDULER.slot(FRESH_LANE):
+                contracts = await run_with_deadline(
+                    sync_single_tender(tender_id, session), TENDER_DEADLINE, "tender"
+                )
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"contracts": contracts}
+
+
+async def sync_tenders(tender_ids: list, session: ClientSession) -> dict:
+    results = await asyncio.gather(*(sync_tender(tender_id, session) for tender_id in tender_ids))
+    return dict(zip(tender_ids, results))
+
+
+async def run_job(job_id: str, tender_ids: list, session: ClientSession) -> None:
+    jobs[job_id]["tenders"] = await sync_tenders(tender_ids, session)
+    jobs[job_id]["status"] = "done"
+
+
+@routes.post("/sync")
+async def sync_view(request: web.Request) -> web.Response:
+    """
+    Syncs tenders given as {"tenders": [...]} body or tender_id query params.
+    Responds with per-contract results, or with a job id to poll if called with wait=0.
+    """
+    check_access(request)
+    tender_ids = request.query.getall("tender_id", [])
+    if request.can_read_body:
+        try:
+            data = await request.json()
+            if not isinstance(data["tenders"], list):
+                raise TypeError
+            tender_ids.extend(data["tenders"])
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Expected {"tenders": [<tender id>, ...]} body')
+    if not tender_ids:
+        raise web.HTTPBadRequest(text="No tenders to sync")
+
+    session = request.app["session"]
+    if request.query.get("wait", "1").lower() in ("0", "false", "no"):
+        job_id = uuid4().hex
+        jobs[job_id] = {"status": "running", "tenders": {}}
+        # running jobs are kept, so they have a place for their results
+        finished = [key for key, job in jobs.items() if job["status"] == "done"]
+        for key in finished[:max(len(jobs) - SYNC_JOBS_LIMIT, 0)]:
+            del jobs[key]
+        task = asyncio.ensure_future(run_job(job_id, tender_ids, session))
+        job_tasks.add(task)
+        task.add_done_callback(job_tasks.discard)
+        return web.json_response({"job_id": job_id, "status": "running"}, status=202)
+
+    LOGGER.info(f"Syncing tenders on demand: {tender_ids}")
+    return web.json_response({"status": "done", "tenders": await sync_tenders(tender_ids, session)})
+
+
+@routes.get("/sync/{job_id}")
+async def sync_job_view(request: web.Request) -> web.Response:
+    check_access(request)
+    job = jobs.get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Job not found")
+    return web.json_response({"job_id": request.match_info["job_id"], **job})
+
+
+def create_app(session: ClientSession) -> web.Application:
+    app = web.Application()
+    app["session"] = session
+    app.add_routes(routes)
+    return app
+
+
+async def start_server(session: ClientSession) -> None:
+    global runner
+    if runner is not None or not SERVER_PORT:
+        return
+    runner = web.AppRunner(create_app(session))
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, SERVER_HOST, SERVER_PORT).start()
+    except Exception as e:
+        LOGGER.warning(f"Can't start http server on {SERVER_HOST}:{SERVER_PORT}. Exception: {type(e)} {e}")
+    else:
+        LOGGER.info(f"Http server started on {SERVER_HOST}:{SERVER_PORT}")
@@ -1,31 +1,57 @@
 import asyncio
 import json
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientError
 from prozorro_crawler.storage import get_feed_position
 
 from prozorro_bridge_contracting.bridge import (
+    AMBIGUOUS_POST_STATUSES,
     BASE_URL,
     HEADERS,
+    CONTRACT_TIMEOUT,
+    TENDER_TIMEOUT,
+    POST_TIMEOUT,
+    POST_RECONCILED,
+    contract_exists,
     get_tender_credentials,
     prepare_contract_data,
     extend_contract,
 )
+from prozorro_bridge_contracting.compression import post_json, observe_response
+from prozorro_bridge_contracting.hedging import HEDGER
+from prozorro_bridge_contracting.inflight import CONTRACTS_IN_FLIGHT
+from prozorro_bridge_contracting.introspection import set_stage, record_error
 from prozorro_bridge_contracting.journal_msg_ids import DATABRIDGE_EXCEPTION
+from prozorro_bridge_contracting.scheduler import SCHEDULER
 from prozorro_bridge_contracting.settings import LOGGER, ERROR_INTERVAL
 from prozorro_bridge_contracting.utils import journal_context
+from prozorro_bridge_contracting.validation import validate_contract
+
+
+class TenderNotFound(ValueError):
+    """
+    Raised for an unknown tender id, on-demand syncs and resumed tenders don't retry it
+    """
 
 
 async def get_tender(tender_id: str, session: ClientSession) -> dict:
     while True:
+        set_stage("tender")
         try:
-            response = await session.get(f"{BASE_URL}/tenders/{tender_id}", headers=HEADERS)
-            data = await response.text()
+            response, data = await HEDGER.request(
+                "tender", session, "get", f"{BASE_URL}/tenders/{tender_id}", headers=HEADERS, timeout=TENDER_TIMEOUT
+            )
+            observe_response(response, data)
+            if response.status == 404:
+                raise TenderNotFound(f"Tender {tender_id} not found")
             if response.status != 200:
                 raise ConnectionError(data)
             tender = json.loads(data)["data"]
             LOGGER.debug(f"Got tender {tender_id} from api: {repr(tender)}")
             return tender
+        except TenderNotFound:
+            # a mistyped or unknown id, there is no point to retry
+            raise
         except Exception as e:
             LOGGER.warning(
                 f"Fail to get tender {tender_id}. Exception: {type(e)} {e}",
@@ -34,10 +60,73 @@ async def get_tender(tender_id: str, session: ClientSession) -> dict:
                     params={"TENDER_ID": tender_id}
                 )
             )
-            await asyncio.sleep(ERROR_INTERVAL)
+            record_error(e)
+            await SCHEDULER.backoff(ERROR_INTERVAL)
+
 
+async def create_contract(contract: dict, tender: dict, session: ClientSession, tender_credentials: dict) -> str:
+    """
+    Creates the contract if it doesn't exist yet, returns "exists" or "created"
+    """
+    LOGGER.info(f"Checking if contract {contract['id']} already exists")
+    set_stage("head")
+    response, _ = await HEDGER.request(
+        "contract", session, "get", f"{BASE_URL}/contracts/{contract['id']}",
+        read=False, timeout=CONTRACT_TIMEOUT,
+    )
+    if response.status == 200:
+        LOGGER.info(f"Contract exists {contract['id']}")
+        return "exists"
+    LOGGER.info(f"Contract {contract['id']} does not exists. Prepare contract for creation.")
 
-async def sync_single_tender(tender_id: str, session: ClientSession = None) -> None:
+    LOGGER.info(f"Extending contract {contract['id']} with extra data")
+    extend_contract(contract, tender)
+    problem = validate_contract(contract)
+    if problem is not None:
+        raise ValueError(f"Invalid contract {contract['id']}: {problem}")
+    set_stage("prepare")
+    await prepare_contract_data(contract, session, tender_credentials)
+
+    LOGGER.info(f"Creating contract {contract['id']}")
+    set_stage("post")
+    try:
+        response = await post_json(
+            session, f"{BASE_URL}/contracts/{contract['id']}", {"data": contract}, HEADERS, timeout=POST_TIMEOUT
+        )
+    except (asyncio.TimeoutError, ClientError):
+        # the api may have accepted the interrupted POST
+        if await reconcile_contract(contract, session):
+            return "created"
+        raise
+    data = await response.text()
+    if response.status == 422:
+        raise ValueError(data)
+    elif response.status == (403, 410, 404, 405):
+        raise PermissionError(data)
+    elif response.status in AMBIGUOUS_POST_STATUSES and await reconcile_contract(contract, session):
+        return "created"
+    elif response.status != 201:
+        raise ConnectionError(data)
+    else:
+        response = await response.json()
+    assert "data" in response
+    LOGGER.info(f"Contract {contract['id']} created")
+    return "created"
+
+
+async def reconcile_contract(contract: dict, session: ClientSession) -> bool:
+    set_stage("reconcile")
+    exists = await contract_exists(contract["id"], session)
+    POST_RECONCILED.inc(result="exists" if exists else "missing")
+    if exists:
+        LOGGER.info(f"Contract {contract['id']} was created by the previous interrupted request")
+    return exists
+
+
+async def sync_single_tender(tender_id: str, session: ClientSession = None) -> dict:
+    """
+    Syncs contracts of the tender, returns their ids mapped to "skipped", "exists" or "created"
+    """
     if not session:
         session = ClientSession(headers=HEADERS)
         feed_position = await get_feed_position()
@@ -45,6 +134,7 @@ async def sync_single_tender(tender_id: str, session: ClientSession = None) -> N
         session.cookie_jar.update_cookies({"SERVER_ID": server_id})
 
     transferred_contracts = []
+    results = {}
     try:
         LOGGER.info(f"Getting tender {tender_id}")
         tender = await get_tender(tender_id, session)
@@ -57,33 +147,17 @@ async def sync_single_tender(tender_id: str, session: ClientSession = None) -> N
         for contract in tender.get("contracts", []):
             if contract["status"] != "active":
                 LOGGER.info(f"Skip contract {contract['id']} in status {contract['status']}")
+                results[contract["id"]] = "skipped"
                 continue
 
-            LOGGER.info(f"Checking if contract {contract['id']} already exists")
-            response = await session.get(f"{BASE_URL}/contracts/{contract['id']}")
-            if response.status == 200:
-                LOGGER.info(f"Contract exists {contract['id']}")
-                continue
-            LOGGER.info(f"Contract {contract['id']} does not exists. Prepare contract for creation.")
-
-            LOGGER.info(f"Extending contract {contract['id']} with extra data")
-            extend_contract(contract, tender)
-            await prepare_contract_data(contract, session, tender_credentials)
-
-            LOGGER.info(f"Creating contract {contract['id']}")
-            response = await session.post(f"{BASE_URL}/contracts/{contract['id']}", json={"data": contract})
-            data = await response.text()
-            if response.status == 422:
-                raise ValueError(data)
-            elif response.status == (403, 410, 404, 405):
-                raise PermissionError(data)
-            elif response.status != 201:
-                raise ConnectionError(data)
-            else:
-                response = await response.json()
-            assert "data" in response
-            LOGGER.info(f"Contract {contract['id']} created")
-            transferred_contracts.append(contract["id"])
+            # the feed may be syncing the same contract, the on-demand sync attaches to it instead of posting twice
+            result = await CONTRACTS_IN_FLIGHT.run(
+                contract["id"], None, lambda: create_contract(contract, tender, session, tender_credentials)
+            )
+            # the feed sync attached to doesn't report whether it has created the contract
+            results[contract["id"]] = result or "exists"
+            if result == "created":
+                transferred_contracts.append(contract["id"])
     except Exception as e:
         LOGGER.exception(e)
         raise
@@ -92,3 +166,4 @@ async def sync_single_tender(tender_id: str, session: ClientSession = None) -> N
             LOGGER.info(f"Successfully transferred contracts: {transferred_contracts}")
         else:
             LOGGER.info(f"Tender {tender_id} does not contain contracts to transfer")
+        return results
@@ -0,0 +1,13 @@
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from prozorro_bridge_contracting.settings import MONGODB_URL, MONGODB_DATABASE
+
+
+database = None
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    global database
+    if database is None:
+        database = AsyncIOMotorClient(MONGODB_URL)[MONGODB_DATABASE]
+    return database
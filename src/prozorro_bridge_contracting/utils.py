@@ -1,3 +1,7 @@
+from datetime import datetime
+from typing import Optional
+import time
+
 from prozorro_bridge_contracting.settings import JOURNAL_PREFIX
 
 
@@ -9,3 +13,17 @@ def journal_context(record: dict = None, params: dict = None) -> dict:
     for k, v in params.items():
         record[JOURNAL_PREFIX + k] = v
     return record
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def seconds_since(value: str) -> Optional[float]:
+    date = parse_date(value)
+    if date is None:
+        return None
+    return time.time() - date.timestamp()
@@ -0,0 +1,111 @@
+from typing import Callable, Optional
+from numbers import Number
+
+from prozorro_bridge_contracting.journal_msg_ids import DATABRIDGE_DATE_MISMATCH
+from prozorro_bridge_contracting.metrics import Counter
+from prozorro_bridge_contracting.settings import LOGGER, CONTRACT_REQUIRED_FIELDS, DISABLED_VALIDATION_RULES
+from prozorro_bridge_contracting.utils import journal_context, parse_date
+
+
+VALIDATION_RULE_HITS = Counter(
+    "contracting_bridge_validation_rule_hits_total",
+    "Contracts fixed or rejected by local validation rules before POST, by rule",
+)
+
+# rule name -> function fixing the contract in place or returning the problem it can't fix
+RULES = {}
+
+
+def rule(name: str) -> Callable:
+    def register(func: Callable[[dict], Optional[str]]) -> Callable:
+        RULES[name] = func
+        return func
+    return register
+
+
+def is_after(first: str, second: str) -> bool:
+    first_date, second_date = parse_date(first), parse_date(second)
+    try:
+        return first_date > second_date
+    except TypeError:
+        # not parsed or naive and aware dates
+        return first > second
+
+
+def validate_contract(contract: dict) -> Optional[str]:
+    """
+    Applies the known fixes to the extended contract before POST.
+    Returns the problem that makes the api reject the contract or None.
+    """
+    for name, check in RULES.items():
+        if name in DISABLED_VALIDATION_RULES:
+            continue
+        problem = check(contract)
+        if problem is not None:
+            VALIDATION_RULE_HITS.inc(rule=name, action="rejected")
+            return f"{name}: {problem}"
+    return None
+
+
+@rule("required_fields")
+def check_required_fields(contract: dict) -> Optional[str]:
+    missing = [field for field in CONTRACT_REQUIRED_FIELDS if contract.get(field) in (None, "", [], {})]
+    if missing:
+        return f"missing {', '.join(missing)}"
+
+
+@rule("items")
+def check_items(contract: dict) -> Optional[str]:
+    items = contract.get("items", [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return "items should be a list of objects"
+    for item in items:
+        quantity = item.get("quantity")
+        if quantity is not None and (not isinstance(quantity, Number) or quantity < 0):
+            return f"invalid quantity {quantity!r} of item {item.get('id')}"
+
+
+@rule("delivery_date")
+def fix_delivery_dates(contract: dict) -> None:
+    for item in contract.get("items", []):
+        if "deliveryDate" in item and item["deliveryDate"].get("startDate") and item["deliveryDate"].get("endDate"):
+            if item["deliveryDate"]["startDate"] > item["deliveryDate"]["endDate"]:
+                journal_params = {"CONTRACT_ID": contract["id"], "TENDER_ID": contract.get("tender_id")}
+                LOGGER.info(
+                    f"Found dates mismatch "
+                    f"{item['deliveryDate']['startDate']} and {item['deliveryDate']['endDate']}",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_DATE_MISMATCH}, journal_params),
+                )
+                del item["deliveryDate"]["startDate"]
+                LOGGER.info(
+                    "startDate value cleaned.",
+                    extra=journal_context({"MESSAGE_ID": DATABRIDGE_DATE_MISMATCH}, journal_params),
+                )
+                VALIDATION_RULE_HITS.inc(rule="delivery_date", action="fixed")
+
+
+@rule("period")
+def check_period(contract: dict) -> Optional[str]:
+    period = contract.get("period") or {}
+    if period.get("startDate") and period.get("endDate") and is_after(period["startDate"], period["endDate"]):
+        return f"period startDate {period['startDate']} is after endDate {period['endDate']}"
+
+
+@rule("value")
+def check_value(contract: dict) -> Optional[str]:
+    value = contract.get("value")
+    if value is None:
+        return None
+    amount = value.get("amount")
+    if not isinstance(amount, Number) or amount < 0:
+        return f"invalid value amount {amount!r}"
+    amount_net = value.get("amountNet")
+    if amount_net is not None and (not isinstance(amount_net, Number) or amount_net > amount):
+        return f"value amountNet {amount_net!r} should be a number not greater than amount {amount}"
+    currency = value.get("currency")
+    if not currency:
+        return "missing value currency"
+    for item in contract.get("items", []):
+        unit_value = (item.get("unit") or {}).get("value") or {}
+        if unit_value.get("currency") and unit_value["currency"] != currency:
+            return f"item {item.get('id')} unit value currency {unit_value['currency']} differs from {currency}"
@@ -0,0 +1,51 @@
+from prozorro_bridge_contracting.journal_msg_ids import DATABRIDGE_INFO
+from prozorro_bridge_contracting.settings import LOGGER
+from prozorro_bridge_contracting.utils import journal_context
+
+
+class ContractWorkItem:
+    """
+    Everything extend_contract and post_contract need to sync one active contract,
+    so the tender (lots, other contracts, its feed page) can be released while the contract is processed.
+    """
+    __slots__ = ("contract", "tender_id", "procuring_entity", "mode", "date_modified")
+
+    def __init__(self, contract: dict, tender: dict) -> None:
+        self.tender_id = tender["id"]
+        self.procuring_entity = tender.get("procuringEntity")
+        if self.procuring_entity is None:
+            # light feed tender, the full contract is fetched together with the tender on demand
+            contract = {k: contract[k] for k in ("id", "status", "date") if k in contract}
+        self.contract = contract
+        self.mode = tender.get("mode")
+        self.date_modified = tender.get("dateModified")
+
+    @property
+    def contract_id(self) -> str:
+        return self.contract["id"]
+
+    @property
+    def tender(self) -> dict:
+        tender = {"id": self.tender_id, "procuringEntity": self.procuring_entity}
+        if self.mode:
+            tender["mode"] = self.mode
+        return tender
+
+
+def get_contract_items(tender: dict) -> list:
+    items = []
+    for contract in tender.get("contracts", []):
+        if contract["status"] != "active":
+            LOGGER.debug(
+                f"Skipping contract {contract['id']} of tender {tender['id']} in status {contract['status']}",
+                extra=journal_context(
+                    {"MESSAGE_ID": DATABRIDGE_INFO},
+                    params={
+                        "TENDER_ID": tender["id"],
+                        "CONTRACT_ID": contract["id"],
+                    }
+                ),
+            )
+            continue
+        items.append(ContractWorkItem(contract, tender))
+    return items
@@ -0,0 +1,215 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.backpressure import Backpressure, get_rss, INTAKE_TRANSITIONS
+from prozorro_bridge_contracting.workitems import ContractWorkItem
+
+
+def get_items(count):
+    tender = {"id": "1", "procuringEntity": {"name": "Entity"}}
+    return [ContractWorkItem({"id": str(i), "status": "active"}, tender) for i in range(count)]
+
+
+def test_get_rss():
+    assert get_rss() > 0
+
+
+def test_pending_work():
+    backpressure = Backpressure(0, 0, 0, 0, 0)
+    first, second = get_items(2), get_items(3)
+    backpressure.add(first)
+    backpressure.add(second)
+    backpressure.add(second)
+    assert (backpressure.tenders, backpressure.contracts) == (2, 5)
+    # contracts are not serialized without a bytes watermark
+    assert backpressure.size == 0
+
+    second.pop()
+    backpressure.remove(second)
+    backpressure.remove(second)
+    assert (backpressure.tenders, backpressure.contracts) == (1, 2)
+
+    backpressure.remove(first)
+    assert (backpressure.tenders, backpressure.contracts, backpressure.size) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER")
+async def test_intake_paused_between_watermarks(mocked_checkpointer):
+    mocked_checkpointer.flush = AsyncMock()
+    backpressure = Backpressure(1000, 500, 0, 0, 0.01)
+    items = get_items(1)
+    backpressure.add(items)
+    rss = MagicMock(return_value=2000)
+    paused_before = INTAKE_TRANSITIONS.get(state="paused", watermark="memory")
+
+    with patch("prozorro_bridge_contracting.backpressure.get_rss", rss):
+        task = asyncio.ensure_future(backpressure.wait())
+        await asyncio.sleep(0.03)
+        assert backpressure.paused is True
+        mocked_checkpointer.flush.assert_awaited_once()
+
+        rss.return_value = 800
+        await asyncio.sleep(0.03)
+        assert not task.done()
+
+        rss.return_value = 400
+        await asyncio.wait_for(task, 1)
+
+    assert backpressure.paused is False
+    assert INTAKE_TRANSITIONS.get(state="paused", watermark="memory") - paused_before == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.get_rss", MagicMock(return_value=None))
+async def test_intake_paused_by_pending_contracts():
+    backpressure = Backpressure(0, 0, 3, 1, 0.01)
+    items = get_items(3)
+    backpressure.add(items)
+    stop = MagicMock(return_value=False)
+
+    with patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock())):
+        task = asyncio.ensure_future(backpressure.wait(stop))
+        await asyncio.sleep(0.03)
+        assert backpressure.paused is True
+
+        stop.return_value = True
+        await asyncio.wait_for(task, 1)
+
+    assert backpressure.paused is False
+    backpressure.remove(items)
+    await asyncio.wait_for(backpressure.wait(), 1)
+
+
+def test_pending_bytes():
+    backpressure = Backpressure(0, 0, 0, 0, 0, high_bytes=1000, low_bytes=500)
+    items = get_items(3)
+    backpressure.add(items)
+    assert backpressure.size > 0
+    assert backpressure.get_pending_exceeded() is None
+
+    backpressure.remove(items)
+    items = get_items(30)
+    backpressure.add(items)
+    assert backpressure.get_pending_exceeded() == "bytes"
+    assert backpressure.is_relieved() is False
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock()))
+@patch("prozorro_bridge_contracting.backpressure.get_rss", MagicMock(return_value=2000))
+async def test_intake_resumed_with_parked_tenders_only():
+    backpressure = Backpressure(1000, 500, 0, 0, 0.01)
+    items = get_items(1)
+    backpressure.add(items)
+    parking = MagicMock(__len__=MagicMock(return_value=0))
+
+    with patch("prozorro_bridge_contracting.backpressure.PARKING", parking):
+        task = asyncio.ensure_future(backpressure.wait())
+        await asyncio.sleep(0.03)
+        assert not task.done()
+
+        # rss stays above the low watermark, but there is nothing left to drain
+        parking.__len__.return_value = 1
+        await asyncio.wait_for(task, 1)
+
+        backpressure.remove(items)
+        await asyncio.wait_for(backpressure.wait(), 1)
+
+    assert backpressure.paused is False
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock()))
+@patch("prozorro_bridge_contracting.backpressure.get_rss", MagicMock(return_value=2000))
+async def test_intake_pause_is_limited():
+    backpressure = Backpressure(1000, 500, 0, 0, 0.01, max_pause=0.05)
+    backpressure.add(get_items(1))
+
+    await asyncio.wait_for(backpressure.wait(), 1)
+
+    assert backpressure.paused is False
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock()))
+@patch("prozorro_bridge_contracting.backpressure.get_rss", MagicMock(return_value=None))
+async def test_oversized_page_started_in_parts():
+    backpressure = Backpressure(0, 0, 4, 2, 0.01)
+    release = asyncio.Event()
+
+    async def process(items):
+        backpressure.add(items)
+        await release.wait()
+        backpressure.remove(items)
+
+    pages = [get_items(2) for _ in range(5)]
+    tasks = []
+
+    async def start_page():
+        for items in pages:
+            await backpressure.admit()
+            tasks.append(asyncio.ensure_future(process(items)))
+
+    starting = asyncio.ensure_future(start_page())
+    await asyncio.sleep(0.03)
+    # started tenders are held above the high watermark of 4 contracts
+    assert len(tasks) == 2
+    assert backpressure.contracts == 4
+
+    release.set()
+    await asyncio.wait_for(starting, 1)
+    await asyncio.gather(*tasks)
+    assert len(tasks) == 5
+    assert backpressure.contracts == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.get_rss", MagicMock(return_value=2000))
+async def test_intake_not_paused_without_draining_work():
+    backpressure = Backpressure(1000, 500, 0, 0, 0.01)
+    paused_before = INTAKE_TRANSITIONS.get(state="paused", watermark="memory")
+
+    with patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock())) as checkpointer:
+        for _ in range(3):
+            await asyncio.wait_for(backpressure.wait(), 1)
+
+    # nothing is pending to release memory, so nothing is logged, counted or flushed per page
+    checkpointer.flush.assert_not_awaited()
+    assert INTAKE_TRANSITIONS.get(state="paused", watermark="memory") == paused_before
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.backpressure.CHECKPOINTER", MagicMock(flush=AsyncMock()))
+async def test_page_admitted_by_rss_while_work_is_pending():
+    backpressure = Backpressure(1000, 500, 0, 0, 0.01)
+    rss = MagicMock(return_value=2000)
+    release = asyncio.Event()
+
+    async def process(items):
+        backpressure.add(items)
+        await release.wait()
+        backpressure.remove(items)
+
+    tasks = []
+
+    async def start_page():
+        for _ in range(3):
+            await backpressure.admit()
+            tasks.append(asyncio.ensure_future(process(get_items(1))))
+
+    with patch("prozorro_bridge_contracting.backpressure.get_rss", rss):
+        starting = asyncio.ensure_future(start_page())
+        await asyncio.sleep(0.05)
+        # rss stays high while the first tender is pending, the rest of the page waits
+        assert len(tasks) == 1
+        assert backpressure.paused is True
+
+        rss.return_value = 400
+        await asyncio.wait_for(starting, 1)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    assert len(tasks) == 3
+    assert backpressure.paused is False
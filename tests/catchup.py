@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+import time
+
+from prozorro_bridge_contracting.bridge import schedule_listing
+from prozorro_bridge_contracting.catchup import CatchUp, FeedHead, CATCH_UP_SKIPPED
+from prozorro_bridge_contracting.parking import PARKING
+from prozorro_bridge_contracting.scheduler import SCHEDULER
+from prozorro_bridge_contracting.workitems import ContractWorkItem
+
+
+@patch("prozorro_bridge_contracting.catchup.LOGGER", MagicMock())
+def test_catch_up_profile():
+    catch_up = CatchUp(3600, 600, 2, 1, 20, 10)
+    limits = {name: lane.limit for name, lane in SCHEDULER.lanes.items()}
+    parking = (PARKING.after_attempts, PARKING.after_seconds)
+
+    catch_up.update(1800)
+    assert catch_up.active is False
+
+    catch_up.update(7200)
+    assert catch_up.active is True
+    assert {name: lane.limit for name, lane in SCHEDULER.lanes.items()} == {
+        name: limit * 2 for name, limit in limits.items()
+    }
+    assert (PARKING.after_attempts, PARKING.after_seconds) == (1, 20)
+
+    catch_up.update(1800)
+    assert catch_up.active is True
+
+    catch_up.update(300)
+    assert catch_up.active is False
+    assert {name: lane.limit for name, lane in SCHEDULER.lanes.items()} == limits
+    assert (PARKING.after_attempts, PARKING.after_seconds) == parking
+
+
+def test_synced_contracts_cache():
+    catch_up = CatchUp(3600, 600, 2, 1, 20, 2)
+    tender = {"id": "1", "procuringEntity": {}}
+    items = [ContractWorkItem({"id": contract_id, "status": "active"}, tender) for contract_id in ("a", "b")]
+    catch_up.mark_synced("a")
+    catch_up.mark_synced("b")
+    assert catch_up.should_skip(items) is False
+
+    catch_up.active = True
+    assert catch_up.should_skip(items) is True
+
+    catch_up.mark_synced("c")
+    assert list(catch_up.synced) == ["b", "c"]
+    assert catch_up.should_skip(items) is False
+
+
+@patch("prozorro_bridge_contracting.bridge.LOGGER")
+def test_synced_tender_skipped_in_catch_up(mocked_logger):
+    catch_up = CatchUp(3600, 600, 2, 1, 20, 10)
+    catch_up.active = True
+    catch_up.mark_synced("a")
+    tender = {
+        "id": "1",
+        "procurementMethodType": "belowThreshold",
+        "procuringEntity": {},
+        "contracts": [{"id": "a", "status": "active"}, {"id": "b", "status": "cancelled"}],
+    }
+    skipped = CATCH_UP_SKIPPED.get()
+
+    with patch("prozorro_bridge_contracting.bridge.CATCH_UP", catch_up):
+        assert schedule_listing(MagicMock(), tender) is None
+
+    assert CATCH_UP_SKIPPED.get() - skipped == 1
+    assert mocked_logger.info.call_count == 0
+    assert mocked_logger.debug.call_count == 0
+
+
+@patch("prozorro_bridge_contracting.catchup.LOGGER", MagicMock())
+def test_catch_up_min_duration():
+    catch_up = CatchUp(3600, 600, 1, 1, 20, 10, min_duration=60)
+
+    catch_up.update(7200)
+    assert catch_up.active is True
+    # the lag drops right after the switch, the mode is kept
+    catch_up.update(300)
+    assert catch_up.active is True
+
+    catch_up.switched_at = time.monotonic() - 60
+    catch_up.update(300)
+    assert catch_up.active is False
+    catch_up.update(7200)
+    assert catch_up.active is False
+
+
+def test_feed_lag_of_forward_pages():
+    feed_head = FeedHead()
+    now = datetime.now().astimezone()
+
+    def page(*ages):
+        return [{"dateModified": (now - timedelta(seconds=age)).isoformat()} for age in ages]
+
+    assert feed_head.get_lag([]) is None
+    assert abs(feed_head.get_lag(page(70, 60)) - 60) < 5
+    # a backward crawler page of old tenders doesn't move the lag
+    assert abs(feed_head.get_lag(page(7200, 10800)) - 60) < 5
+    assert abs(feed_head.get_lag(page(30, 20)) - 20) < 5
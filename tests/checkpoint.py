@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+import pytest
+from unittest.mock import AsyncMock
+
+from prozorro_bridge_contracting.checkpoint import CheckpointCoalescer
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_coalesced_by_pages():
+    save = AsyncMock()
+    module = SimpleNamespace(save_feed_position=save)
+    checkpointer = CheckpointCoalescer(pages=3, interval=3600)
+    assert checkpointer.install(save, module) is True
+    assert module.save_feed_position is checkpointer
+
+    for offset in range(7):
+        await module.save_feed_position({"offset": offset})
+
+    assert save.await_args_list == [(({"offset": 2},),), (({"offset": 5},),)]
+
+    await checkpointer.flush()
+    await checkpointer.flush()
+    assert save.await_count == 3
+    assert save.await_args.args == ({"offset": 6},)
+
+
+@pytest.mark.asyncio
+async def test_checkpoints_coalesced_by_interval():
+    save = AsyncMock()
+    checkpointer = CheckpointCoalescer(pages=100, interval=0)
+    checkpointer.install(save)
+
+    await checkpointer({"offset": 1})
+    await checkpointer({"offset": 2})
+
+    assert save.await_count == 2
+
+
+def test_checkpoints_not_installed():
+    checkpointer = CheckpointCoalescer(pages=3, interval=10)
+    assert checkpointer.install(None) is False
+
+
+@pytest.mark.asyncio
+async def test_partial_positions_merged():
+    save = AsyncMock()
+    checkpointer = CheckpointCoalescer(pages=4, interval=3600)
+    checkpointer.install(save)
+
+    await checkpointer({"forward_offset": 1, "server_id": "a"})
+    await checkpointer({"backward_offset": 10})
+    await checkpointer({"forward_offset": 2})
+    await checkpointer.flush()
+
+    assert save.await_args_list == [
+        (({"forward_offset": 2, "backward_offset": 10, "server_id": "a"},),),
+    ]
+
+    await checkpointer({"backward_offset": 9})
+    await checkpointer.flush()
+    # only parts saved since the last write are written again
+    assert save.await_args.args == ({"backward_offset": 9},)
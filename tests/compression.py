@@ -0,0 +1,66 @@
+import gzip
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting import compression
+from prozorro_bridge_contracting.compression import encode_json_body, observe_response, post_json, PAYLOAD_BYTES
+
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+def test_encode_json_body_disabled():
+    payload = {"data": {"id": "1"}}
+    assert encode_json_body(payload, HEADERS) == {"json": payload, "headers": HEADERS}
+
+
+@patch("prozorro_bridge_contracting.compression.COMPRESS_REQUESTS", True)
+@patch("prozorro_bridge_contracting.compression.COMPRESS_MIN_SIZE", 1024)
+def test_encode_json_body():
+    small = {"data": {"id": "1"}}
+    assert encode_json_body(small, HEADERS) == {"data": json.dumps(small).encode(), "headers": HEADERS}
+
+    large = {"data": {"id": "1", "items": [{"description": "Item description"} for _ in range(100)]}}
+    request_wire_size = PAYLOAD_BYTES.get(direction="request", size="wire")
+    kwargs = encode_json_body(large, HEADERS)
+
+    assert kwargs["headers"] == {**HEADERS, "Content-Encoding": "gzip"}
+    assert json.loads(gzip.decompress(kwargs["data"])) == large
+    assert PAYLOAD_BYTES.get(direction="request", size="wire") == request_wire_size + len(kwargs["data"])
+
+
+def test_observe_response():
+    decoded_size = PAYLOAD_BYTES.get(direction="response", size="decoded")
+    wire_size = PAYLOAD_BYTES.get(direction="response", size="wire")
+
+    observe_response(MagicMock(headers={}), "{}")
+    observe_response(MagicMock(headers={"Content-Encoding": "gzip", "Content-Length": "10"}), "{}" * 50)
+    # decoded size is counted in bytes, cyrillic characters take two of them
+    observe_response(MagicMock(headers={"Content-Encoding": "gzip", "Content-Length": "0"}), "Договір")
+
+    assert PAYLOAD_BYTES.get(direction="response", size="decoded") == decoded_size + 100 + 14
+    assert PAYLOAD_BYTES.get(direction="response", size="wire") == wire_size + 10
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.compression.COMPRESS_REQUESTS", True)
+@patch("prozorro_bridge_contracting.compression.COMPRESS_MIN_SIZE", 0)
+@patch("prozorro_bridge_contracting.compression.compression_rejected", False)
+async def test_post_json_falls_back_to_plain_body():
+    payload = {"data": {"id": "1"}}
+    session = MagicMock()
+    session.post = AsyncMock(side_effect=[MagicMock(status=400), MagicMock(status=400)])
+
+    # the plain body is rejected the same way, the payload is wrong, not the encoding
+    assert (await post_json(session, "/contracts", payload, HEADERS)).status == 400
+    assert compression.compression_rejected is False
+
+    session.post = AsyncMock(side_effect=[MagicMock(status=415), MagicMock(status=201), MagicMock(status=201)])
+    assert (await post_json(session, "/contracts", payload, HEADERS, timeout=1)).status == 201
+    assert session.post.await_args_list[1].kwargs == {"json": payload, "headers": HEADERS, "timeout": 1}
+    assert compression.compression_rejected is True
+
+    # compression is not tried again
+    await post_json(session, "/contracts", payload, HEADERS)
+    assert session.post.await_args.kwargs == {"json": payload, "headers": HEADERS}
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+import asyncio
+import pytest
+import time
+from unittest.mock import patch, MagicMock, AsyncMock, call
+
+from prozorro_bridge_contracting.coordination import Coordinator
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.documents:
+            raise StopAsyncIteration
+        return self.documents.pop(0)
+
+
+def test_owns():
+    coordinator = Coordinator("node", partitions=4, lease_ttl=30, heartbeat_interval=10)
+    tender_ids = [str(i) for i in range(20)]
+    assert all(coordinator.owns(tender_id) for tender_id in tender_ids)
+
+    coordinator.task = MagicMock()
+    coordinator.renewed_at = time.monotonic()
+    coordinator.owned = {0, 1}
+    coordinator.owners = {0: "node", 1: "node", 2: "other"}
+    for tender_id in tender_ids:
+        partition = coordinator.get_partition(tender_id)
+        assert coordinator.owns(tender_id) is (partition != 2)
+
+    # leases are not renewed for lease_ttl, no tender is claimed
+    coordinator.renewed_at = time.monotonic() - 30
+    assert not any(coordinator.owns(tender_id) for tender_id in tender_ids)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_takes_fair_share():
+    coordinator = Coordinator("node", partitions=4, lease_ttl=30, heartbeat_interval=10)
+    database = MagicMock()
+    database.nodes.update_one = AsyncMock()
+    database.nodes.count_documents = AsyncMock(return_value=2)
+    database.leases.find = MagicMock(return_value=AsyncCursor([{"_id": 0, "owner": "other"}]))
+    database.leases.update_one = AsyncMock(
+        side_effect=lambda query, *args, **kwargs: MagicMock(matched_count=0, upserted_id=query["_id"])
+    )
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.heartbeat()
+
+    assert coordinator.owned == {1, 2}
+    assert coordinator.owners == {0: "other", 1: "node", 2: "node"}
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_releases_extra_partitions():
+    coordinator = Coordinator("node", partitions=4, lease_ttl=30, heartbeat_interval=10)
+    coordinator.owned = {0, 1, 2, 3}
+    database = MagicMock()
+    database.nodes.update_one = AsyncMock()
+    database.nodes.count_documents = AsyncMock(return_value=4)
+    database.leases.find = MagicMock(return_value=AsyncCursor([]))
+    database.leases.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.heartbeat()
+
+    assert len(coordinator.owned) == 1
+
+
+@pytest.mark.asyncio
+async def test_skipped_tenders_are_saved_for_handoff():
+    coordinator = Coordinator("node", partitions=4, lease_ttl=30, heartbeat_interval=10)
+    coordinator.task = MagicMock()
+    coordinator.renewed_at = time.monotonic()
+    coordinator.owned = {0, 1}
+    coordinator.owners = {0: "node", 1: "node", 2: "other", 3: "other"}
+    tender_ids = [str(i) for i in range(20)]
+    owned = [tender_id for tender_id in tender_ids if coordinator.owns(tender_id, datetime.now().isoformat())]
+    # tenders modified longer than handoff_ttl ago are not recorded
+    old = datetime.now() - timedelta(seconds=coordinator.handoff_ttl + 1)
+    assert not any(coordinator.owns(tender_id, old.isoformat()) for tender_id in set(tender_ids) - set(owned))
+    database = MagicMock()
+    database.handoff.bulk_write = AsyncMock()
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.save_skipped()
+        await coordinator.save_skipped()
+
+    database.handoff.bulk_write.assert_awaited_once()
+    requests = database.handoff.bulk_write.await_args.args[0]
+    assert sorted(request._filter["_id"] for request in requests) == sorted(set(tender_ids) - set(owned))
+    assert all(request._doc["$set"]["expires"] > datetime.utcnow() for request in requests)
+    assert coordinator.processed == owned
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_hands_over_skipped_tenders():
+    coordinator = Coordinator("node", partitions=2, lease_ttl=30, heartbeat_interval=10)
+    coordinator.owned = {0}
+    coordinator.processed_before = ["a"]
+    coordinator.processed = ["b"]
+    coordinator.requeue = AsyncMock()
+    database = MagicMock()
+    database.nodes.update_one = AsyncMock()
+    database.nodes.count_documents = AsyncMock(return_value=1)
+    database.leases.find = MagicMock(return_value=AsyncCursor([{"_id": 0, "owner": "node"}]))
+    database.leases.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    database.handoff.find = MagicMock(return_value=AsyncCursor([{"_id": "c", "partition": 1}]))
+    database.handoff.delete_many = AsyncMock()
+    database.pending.update_one = AsyncMock()
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.heartbeat()
+        await asyncio.sleep(0)
+
+    assert coordinator.owned == {0, 1}
+    assert coordinator.taken_over == set()
+    database.handoff.find.assert_called_once_with(
+        {"partition": {"$in": [1]}}, sort=[("dateModified", -1)], limit=coordinator.requeue_limit
+    )
+    assert database.handoff.delete_many.await_args_list[0].args == ({"_id": {"$in": ["a", "b"]}},)
+    assert database.handoff.delete_many.await_args_list[1].args == ({"_id": {"$in": ["c"]}},)
+    database.pending.update_one.assert_awaited_once_with(
+        {"_id": "c"}, {"$set": {"_id": "c", "node": "node", "partition": coordinator.get_partition("c")}}, upsert=True
+    )
+    coordinator.requeue.assert_awaited_once_with("c")
+    assert coordinator.processed_before == ["b"]
+    assert coordinator.processed == []
+
+
+
+@pytest.mark.asyncio
+async def test_hand_over_is_limited():
+    coordinator = Coordinator("node", partitions=2, lease_ttl=30, heartbeat_interval=10, requeue_limit=2)
+    database = MagicMock()
+    database.handoff.find = MagicMock(return_value=AsyncCursor([{"_id": "c"}, {"_id": "b"}]))
+    database.handoff.count_documents = AsyncMock(return_value=5)
+    database.handoff.delete_many = AsyncMock()
+    database.pending.update_one = AsyncMock()
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.hand_over([1])
+
+    assert database.pending.update_one.await_count == 2
+    assert database.handoff.delete_many.await_args_list == [
+        call({"partition": {"$in": [1]}, "_id": {"$nin": ["c", "b"]}}),
+        call({"_id": {"$in": ["c", "b"]}}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_partitions_released_when_leases_expire():
+    coordinator = Coordinator("node", partitions=2, lease_ttl=0.05, heartbeat_interval=0.01)
+    coordinator.owned = {0, 1}
+    coordinator.owners = {0: "node", 1: "node"}
+    coordinator.renewed_at = time.monotonic()
+    database = MagicMock()
+    database.nodes.update_one = AsyncMock(side_effect=ConnectionError("Mongo is down"))
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        coordinator.task = asyncio.ensure_future(coordinator.run())
+        await asyncio.sleep(0.03)
+        # the leases are still live
+        assert coordinator.owned == {0, 1}
+
+        await asyncio.sleep(0.05)
+        assert coordinator.owned == set()
+        assert coordinator.owners == {}
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(coordinator.wait_leased(), 0.03)
+        coordinator.task.cancel()
+
+
+
+@pytest.mark.asyncio
+async def test_hand_over_claims_pending_tenders():
+    coordinator = Coordinator("node", partitions=2, lease_ttl=30, heartbeat_interval=10)
+    coordinator.requeue = AsyncMock()
+    database = MagicMock()
+    database.handoff.find = MagicMock(return_value=AsyncCursor([]))
+    database.pending.find = MagicMock(return_value=AsyncCursor([{"_id": "d"}]))
+    database.pending.update_many = AsyncMock()
+
+    with patch("prozorro_bridge_contracting.coordination.get_database", MagicMock(return_value=database)):
+        await coordinator.hand_over([1])
+        await asyncio.sleep(0)
+
+    # pending tenders of other (stopped) replicas are resumed by the new owner of their partition only
+    database.pending.find.assert_called_once_with({"partition": {"$in": [1]}, "node": {"$ne": "node"}})
+    database.pending.update_many.assert_awaited_once_with({"_id": {"$in": ["d"]}}, {"$set": {"node": "node"}})
+    coordinator.requeue.assert_awaited_once_with("d")
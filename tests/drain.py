@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.drain import GracefulDrain
+from prozorro_bridge_contracting.inflight import TENDERS_IN_FLIGHT
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.drain.CHECKPOINTER")
+@patch("prozorro_bridge_contracting.drain.COORDINATOR")
+async def test_drain_saves_unfinished_tenders(mocked_coordinator, mocked_checkpointer):
+    mocked_checkpointer.flush = AsyncMock()
+    mocked_coordinator.stop = AsyncMock()
+    mocked_coordinator.get_pending_record = lambda tender_id: {"_id": tender_id, "node": "node", "partition": 0}
+    database = MagicMock()
+    database.pending.update_one = AsyncMock()
+    drain = GracefulDrain(timeout=0.01)
+    drain.page_done = asyncio.Event()
+    drain.blocked = asyncio.Event()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def data_handler():
+        tasks = [asyncio.ensure_future(TENDERS_IN_FLIGHT.run("tender", None, hang))]
+        async with drain.page(tasks):
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # the crawler asks for the next page
+        await drain.block()
+
+    handler = asyncio.ensure_future(data_handler())
+    await asyncio.sleep(0)
+    loop = asyncio.get_event_loop()
+    with patch("prozorro_bridge_contracting.drain.get_database", MagicMock(return_value=database)):
+        with patch.object(loop, "stop") as mocked_stop:
+            drain.start()
+            assert drain.draining is True
+            while not drain.drained:
+                await asyncio.sleep(0.01)
+
+    database.pending.update_one.assert_awaited_once_with(
+        {"_id": "tender"}, {"$set": {"_id": "tender", "node": "node", "partition": 0}}, upsert=True
+    )
+    assert "tender" not in TENDERS_IN_FLIGHT
+    mocked_checkpointer.flush.assert_awaited_once()
+    mocked_coordinator.stop.assert_awaited_once()
+    mocked_stop.assert_called_once()
+    handler.cancel()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.drain.sync_single_tender")
+async def test_resume_unfinished_tenders(mocked_sync):
+    mocked_sync.side_effect = [ConnectionError("Error!"), {"1": "created"}, ValueError("Invalid contract")]
+
+    class Cursor:
+        def __init__(self):
+            self.documents = [{"_id": "1"}, {"_id": "2"}]
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.documents:
+                raise StopAsyncIteration
+            return self.documents.pop(0)
+
+    database = MagicMock()
+    database.pending.find = MagicMock(return_value=Cursor())
+    database.pending.delete_one = AsyncMock()
+    drain = GracefulDrain(timeout=0.01)
+
+    with patch("prozorro_bridge_contracting.drain.get_database", MagicMock(return_value=database)):
+        with patch("prozorro_bridge_contracting.drain.ERROR_INTERVAL", 0):
+            await drain.resume(AsyncMock())
+
+    assert mocked_sync.call_count == 3
+    assert sorted(c.args[0]["_id"] for c in database.pending.delete_one.call_args_list) == ["1", "2"]
+
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.drain.CHECKPOINTER", MagicMock(flush=AsyncMock()))
+@patch("prozorro_bridge_contracting.drain.COORDINATOR")
+async def test_drain_cancels_concurrent_pages(mocked_coordinator):
+    mocked_coordinator.stop = AsyncMock()
+    mocked_coordinator.get_pending_record = lambda tender_id: {"_id": tender_id}
+    database = MagicMock()
+    database.pending.update_one = AsyncMock()
+    drain = GracefulDrain(timeout=0.02)
+    drain.page_done = asyncio.Event()
+    drain.page_done.set()
+    drain.blocked = asyncio.Event()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def data_handler(tender_id, duration):
+        async def work():
+            await asyncio.sleep(duration)
+
+        tasks = [asyncio.ensure_future(TENDERS_IN_FLIGHT.run(tender_id, None, work))]
+        async with drain.page(tasks):
+            await asyncio.gather(*tasks, return_exceptions=True)
+            scheduled = [(f"{tender_id}-next", hang())]
+            if drain.draining:
+                await drain.save_unstarted(scheduled)
+            else:
+                scheduled[0][1].close()
+        await drain.block()
+
+    # forward and backward pages are handled at the same time, the forward one finishes first
+    forward = asyncio.ensure_future(data_handler("forward", 0))
+    backward = asyncio.ensure_future(data_handler("backward", 10))
+    await asyncio.sleep(0)
+    loop = asyncio.get_event_loop()
+    with patch("prozorro_bridge_contracting.drain.get_database", MagicMock(return_value=database)):
+        with patch.object(loop, "stop"):
+            drain.start()
+            while not drain.drained:
+                await asyncio.sleep(0.01)
+
+    saved = {c.args[0]["_id"] for c in database.pending.update_one.await_args_list}
+    # the backward page still running when the forward one is done is cancelled and saved too
+    assert {"backward", "backward-next"} <= saved
+    assert "backward" not in TENDERS_IN_FLIGHT
+    assert drain.pages == []
+    forward.cancel()
+    backward.cancel()
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.drain.COORDINATION", True)
+async def test_resume_left_to_partition_owners():
+    database = MagicMock()
+    drain = GracefulDrain(timeout=0.01)
+
+    with patch("prozorro_bridge_contracting.drain.get_database", MagicMock(return_value=database)):
+        await drain.resume(AsyncMock())
+
+    database.pending.find.assert_not_called()
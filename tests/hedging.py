@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.hedging import Hedger, HEDGED_REQUESTS
+
+
+def get_hedger(**kwargs):
+    params = dict(
+        enabled=True, percentile=50, window=10, min_samples=2, budget=1, burst=1, other_backend=False,
+    )
+    params.update(kwargs)
+    return Hedger(**params)
+
+
+def get_session(*delays):
+    responses = [MagicMock(status=200, text=AsyncMock(return_value=str(i))) for i in range(len(delays))]
+    calls = iter(zip(delays, responses))
+
+    async def get(url, **kwargs):
+        delay, response = next(calls)
+        if isinstance(delay, Exception):
+            raise delay
+        await asyncio.sleep(delay)
+        return response
+
+    session = MagicMock()
+    session.get = AsyncMock(side_effect=get)
+    return session, responses
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_before_enough_samples():
+    hedger = get_hedger()
+    session, _ = get_session(0.02)
+
+    response, data = await hedger.request("tender", session, "get", "/tenders/1")
+
+    assert data == "0"
+    assert session.get.await_count == 1
+    assert len(hedger.latencies["tender"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins():
+    hedger = get_hedger()
+    hedger.latencies["tender"] = [0.01, 0.01]
+    session, responses = get_session(1, 0)
+    before = HEDGED_REQUESTS.get(endpoint="tender", outcome="won")
+
+    response, data = await hedger.request("tender", session, "get", "/tenders/1")
+
+    assert response is responses[1]
+    assert data == "1"
+    assert session.get.await_count == 2
+    assert HEDGED_REQUESTS.get(endpoint="tender", outcome="won") - before == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_budget():
+    hedger = get_hedger(budget=0.5)
+    hedger.latencies["tender"] = [0.01, 0.01]
+    session, _ = get_session(0.05)
+
+    response, data = await hedger.request("tender", session, "get", "/tenders/1")
+
+    assert data == "0"
+    assert session.get.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_answers_after_primary_error():
+    hedger = get_hedger()
+    hedger.latencies["tender"] = [0.01, 0.01]
+
+    async def get(url, **kwargs):
+        if session.get.await_count == 1:
+            await asyncio.sleep(0.05)
+            raise ConnectionResetError()
+        await asyncio.sleep(0.1)
+        return MagicMock(status=200, text=AsyncMock(return_value="hedge"))
+
+    session = MagicMock()
+    session.get = AsyncMock(side_effect=get)
+
+    response, data = await hedger.request("tender", session, "get", "/tenders/1")
+
+    assert data == "hedge"
+
+
+@pytest.mark.asyncio
+async def test_all_requests_fail():
+    hedger = get_hedger()
+    session, _ = get_session(ConnectionResetError("Error!"))
+
+    with pytest.raises(ConnectionResetError):
+        await hedger.request("tender", session, "get", "/tenders/1")
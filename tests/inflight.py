@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+
+from prozorro_bridge_contracting.inflight import InFlightRegistry, INFLIGHT_DEDUP
+
+
+@pytest.mark.asyncio
+async def test_inflight_attach():
+    registry = InFlightRegistry("test_attach")
+    calls = []
+    release = asyncio.Event()
+
+    async def work(name):
+        calls.append(name)
+        await release.wait()
+        return name
+
+    first = asyncio.ensure_future(registry.run("1", "2021-01-01", lambda: work("first")))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(registry.run("1", "2021-01-01", lambda: work("second")))
+    await asyncio.sleep(0)
+    assert "1" in registry
+    release.set()
+
+    assert await asyncio.gather(first, second) == ["first", "first"]
+    assert calls == ["first"]
+    assert "1" not in registry
+    assert INFLIGHT_DEDUP.get(kind="test_attach", action="attach") == 1
+
+
+@pytest.mark.asyncio
+async def test_inflight_supersede():
+    registry = InFlightRegistry("test_supersede")
+    calls = []
+    release = asyncio.Event()
+
+    async def work(name):
+        calls.append(name)
+        await release.wait()
+        return name
+
+    first = asyncio.ensure_future(registry.run("1", "2021-01-01", lambda: work("first")))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(registry.run("1", "2021-01-02", lambda: work("second")))
+    await asyncio.sleep(0)
+    third = asyncio.ensure_future(registry.run("1", "2021-01-03", lambda: work("third")))
+    await asyncio.sleep(0)
+    assert calls == ["first"]
+    release.set()
+
+    assert await asyncio.gather(first, second, third) == ["first", "third", "third"]
+    assert calls == ["first", "third"]
+    assert "1" not in registry
+    assert INFLIGHT_DEDUP.get(kind="test_supersede", action="supersede") == 2
+
+
+@pytest.mark.asyncio
+async def test_inflight_exception():
+    registry = InFlightRegistry("test_exception")
+
+    async def work():
+        await asyncio.sleep(0)
+        raise ConnectionError("Error!")
+
+    results = await asyncio.gather(
+        registry.run("1", None, work),
+        registry.run("1", None, work),
+        return_exceptions=True,
+    )
+
+    assert [type(r) for r in results] == [ConnectionError, ConnectionError]
+    assert "1" not in registry
@@ -0,0 +1,63 @@
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestClient, TestServer
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.bridge import process_contract_items
+from prozorro_bridge_contracting.introspection import take_snapshot, track, record_error, get_pool_stats
+from prozorro_bridge_contracting.server import create_app
+from prozorro_bridge_contracting.workitems import ContractWorkItem
+
+
+def test_record_error():
+    with track("tender", "1") as activity:
+        record_error(ConnectionError("Error!"))
+        assert take_snapshot()["activities"][0]["id"] == "1"
+    assert activity.attempts == 1
+    assert activity.last_error == "ConnectionError: Error!"
+    assert activity.stage == "backoff"
+    assert take_snapshot()["activities"] == []
+    record_error(ConnectionError("Error!"))
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_snapshot_of_in_flight_work():
+    head_sent = asyncio.Event()
+
+    async def head(*args, **kwargs):
+        head_sent.set()
+        await asyncio.sleep(10)
+
+    session = MagicMock()
+    session.head = AsyncMock(side_effect=head)
+    tender = {"id": "tender-1", "procuringEntity": {}}
+    items = [ContractWorkItem({"id": "contract-1", "status": "active"}, tender)]
+
+    task = asyncio.ensure_future(process_contract_items(items, session))
+    await head_sent.wait()
+    snapshot = take_snapshot()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    activities = {activity["kind"]: activity for activity in snapshot["activities"]}
+    assert activities["tender"]["id"] == "tender-1"
+    assert activities["tender"]["stage"] == "contracts"
+    assert activities["contract"]["id"] == "contract-1"
+    assert activities["contract"]["stage"] == "head"
+    assert snapshot["in_flight"]["contracts"] == 1
+    assert snapshot["scheduler"]["backlog"]["active"] == 1
+    assert snapshot["pending"]["contracts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_view():
+    async with ClientSession() as session:
+        assert get_pool_stats(session)["acquired"] == 0
+        async with TestClient(TestServer(create_app(session))) as client:
+            response = await client.get("/snapshot")
+            assert response.status == 200
+            data = await response.json()
+    assert data["activities"] == []
+    assert data["connection_pool"]["limit"] == 100
@@ -0,0 +1,65 @@
+from queue import SimpleQueue
+import logging
+from unittest.mock import patch
+
+from prozorro_bridge_contracting.journal_msg_ids import (
+    DATABRIDGE_CONTRACT_EXISTS,
+    DATABRIDGE_CONTRACT_CREATED,
+    DATABRIDGE_LOG_SUMMARY,
+)
+from prozorro_bridge_contracting.logs import AggregatingQueueHandler, install_queue_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+def test_aggregating_queue_handler():
+    queue = SimpleQueue()
+    handler = AggregatingQueueHandler(queue, (DATABRIDGE_CONTRACT_EXISTS,), interval=3600)
+    logger = logging.getLogger("test_aggregating_queue_handler")
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    for _ in range(3):
+        logger.info("Contract exists", extra={"MESSAGE_ID": DATABRIDGE_CONTRACT_EXISTS})
+    logger.warning("Contract created", extra={"MESSAGE_ID": DATABRIDGE_CONTRACT_CREATED})
+    handler.flush_counts(logger.name)
+
+    records = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [r.getMessage() for r in records] == [
+        "Contract created",
+        f"Aggregated log messages: {DATABRIDGE_CONTRACT_EXISTS}=3",
+    ]
+    assert records[1].MESSAGE_ID == DATABRIDGE_LOG_SUMMARY
+
+
+def test_install_queue_logging():
+    logger = logging.getLogger("test_install_queue_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    target = ListHandler()
+    logger.addHandler(target)
+
+    stop = install_queue_logging(logger)
+    logger.info("Message %s", 1)
+    stop()
+
+    assert isinstance(logger.handlers[0], AggregatingQueueHandler)
+    assert target.messages == ["Message 1"]
+
+
+def test_install_queue_logging_without_handlers():
+    logger = logging.getLogger("test_install_queue_logging_without_handlers")
+    root = logging.getLogger()
+    with patch.object(root, "handlers", []):
+        stop = install_queue_logging(logger)
+        stop()
+        # records still reach the last resort handler, a later basicConfig still configures the root logger
+        assert root.handlers == []
+    assert logger.handlers == []
@@ -1,5 +1,6 @@
 from copy import deepcopy
 from datetime import datetime
+import asyncio
 import json
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock, call
@@ -14,8 +15,13 @@ from prozorro_bridge_contracting.bridge import (
     process_listing,
     HEADERS,
     BASE_URL, check_tender,
+    CONTRACT_TIMEOUT,
+    CREDENTIALS_TIMEOUT,
+    TENDER_TIMEOUT,
+    POST_TIMEOUT,
 )
-from prozorro_bridge_contracting.single import get_tender, sync_single_tender
+from prozorro_bridge_contracting.inflight import CONTRACTS_IN_FLIGHT
+from prozorro_bridge_contracting.single import get_tender, sync_single_tender, TenderNotFound
 
 
 @pytest.mark.asyncio
@@ -275,7 +281,7 @@ async def test_retry_post_contracts_success(mocked_logger):
     with patch("prozorro_bridge_contracting.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await post_contract(contract, session_mock)
 
-    post_call = call(f"{BASE_URL}/contracts", json={'data': contract}, headers=HEADERS)
+    post_call = call(f"{BASE_URL}/contracts", json={'data': contract}, headers=HEADERS, timeout=POST_TIMEOUT)
     session_mock.mock_calls = [post_call] * 2
     mocked_logger.warning.assert_called_once()
     mocked_sleep.assert_called_once_with(5)
@@ -296,7 +302,7 @@ async def test_retry_post_contracts_fail(mocked_logger):
     with patch("prozorro_bridge_contracting.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
         await post_contract(contract, session_mock)
 
-    post_call = call(f"{BASE_URL}/contracts", json={'data': contract}, headers=HEADERS)
+    post_call = call(f"{BASE_URL}/contracts", json={'data': contract}, headers=HEADERS, timeout=POST_TIMEOUT)
     session_mock.mock_calls = [post_call] * 3
 
     assert mocked_logger.warning.call_count == 1
@@ -441,7 +447,8 @@ async def test_process_tender_contracts_not_exists():
     assert session_mock.head.mock_calls == [
         call(
             f"{BASE_URL}/contracts/{contract['id']}",
-            headers=HEADERS
+            headers=HEADERS,
+            timeout=CONTRACT_TIMEOUT,
         )
     ]
     assert session_mock.post.mock_calls == [
@@ -457,7 +464,8 @@ async def test_process_tender_contracts_not_exists():
                     "tender_id": tender_id,
                 }
             },
-            headers=HEADERS
+            headers=HEADERS,
+            timeout=POST_TIMEOUT,
         ),
     ]
 
@@ -687,6 +695,216 @@ async def test_process_listing(mocked_logger):
                     "tender_id": "1",
                 }
             },
-            headers=HEADERS
+            headers=HEADERS,
+            timeout=POST_TIMEOUT,
         ),
     ]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+@patch("prozorro_bridge_contracting.single.LOGGER", MagicMock())
+async def test_process_listing_light_feed():
+    feed_tender = {
+        "id": "1",
+        "procurementMethodType": "belowThreshold",
+        "contracts": [
+            {"id": "1", "status": "active", "items": [{"id": "1"}]},
+            {"id": "2", "status": "active"},
+        ],
+    }
+    tender = {
+        "id": "1",
+        "procurementMethodType": "belowThreshold",
+        "procuringEntity": "procuringEntity",
+        "contracts": [
+            {"id": "1", "status": "active", "items": [{"id": "1"}]},
+            {"id": "2", "status": "cancelled"},
+        ],
+    }
+    tender_credentials_data = {
+        "tender_token": "tender_token",
+        "owner": "owner",
+    }
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404), MagicMock(status=404)])
+    session_mock.get = AsyncMock(
+        side_effect=[
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender}))),
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender_credentials_data}))),
+        ]
+    )
+    session_mock.post = AsyncMock(return_value=MagicMock(status=201))
+
+    await process_listing(session_mock, feed_tender)
+
+    # the full tender is fetched once for both contracts
+    assert session_mock.get.call_args_list == [
+        call(f"{BASE_URL}/tenders/1", headers=HEADERS, timeout=TENDER_TIMEOUT),
+        call(f"{BASE_URL}/tenders/1/extract_credentials", headers=HEADERS, timeout=CREDENTIALS_TIMEOUT),
+    ]
+    assert session_mock.head.await_count == 2
+    assert session_mock.post.mock_calls == [
+        call(
+            f"{BASE_URL}/contracts",
+            json={
+                "data": {
+                    "id": "1",
+                    "status": "active",
+                    "items": [{"id": "1"}],
+                    "procuringEntity": "procuringEntity",
+                    "owner": "owner",
+                    "tender_token": "tender_token",
+                    "tender_id": "1",
+                }
+            },
+            headers=HEADERS,
+            timeout=POST_TIMEOUT,
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+@patch("prozorro_bridge_contracting.bridge.CONTRACT_DEADLINE", 0.01)
+async def test_process_tender_contracts_deadline():
+    tender = {
+        "id": "1",
+        "procuringEntity": "procuringEntity",
+        "contracts": [{"id": "1", "status": "active"}],
+    }
+
+    responses = [None, MagicMock(status=200)]
+
+    async def head(*args, **kwargs):
+        response = responses.pop(0)
+        if response is None:
+            await asyncio.sleep(1)
+        return response
+
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=head)
+
+    with patch("prozorro_bridge_contracting.bridge.DEADLINE_EXCEEDED") as mocked_counter:
+        with patch("prozorro_bridge_contracting.bridge.ERROR_INTERVAL", 0):
+            await process_tender_contracts(tender, session_mock)
+
+    assert session_mock.head.await_count == 2
+    mocked_counter.inc.assert_called_once_with(scope="contract")
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_post_contract_timeout_reconciliation():
+    contract = {"id": "42", "tender_id": "1984"}
+    session_mock = AsyncMock()
+    session_mock.post = AsyncMock(side_effect=[asyncio.TimeoutError(), asyncio.TimeoutError()])
+    session_mock.head = AsyncMock(side_effect=[MagicMock(status=404), MagicMock(status=200)])
+
+    with patch("prozorro_bridge_contracting.bridge.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        await post_contract(contract, session_mock)
+
+    assert session_mock.post.await_count == 2
+    assert session_mock.head.mock_calls == [
+        call(f"{BASE_URL}/contracts/42", headers=HEADERS, timeout=CONTRACT_TIMEOUT),
+        call(f"{BASE_URL}/contracts/42", headers=HEADERS, timeout=CONTRACT_TIMEOUT),
+    ]
+    assert mocked_sleep.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_post_contract_gateway_error_reconciliation():
+    contract = {"id": "42", "tender_id": "1984"}
+    session_mock = AsyncMock()
+    session_mock.post = AsyncMock(
+        return_value=MagicMock(status=504, text=AsyncMock(return_value="Gateway Timeout"))
+    )
+    session_mock.head = AsyncMock(return_value=MagicMock(status=200))
+
+    with patch("prozorro_bridge_contracting.bridge.asyncio.sleep", AsyncMock()):
+        await post_contract(contract, session_mock)
+
+    # the contract was created by the request that timed out at the gateway, it's not uploaded again
+    assert session_mock.post.await_count == 1
+    assert session_mock.head.mock_calls == [
+        call(f"{BASE_URL}/contracts/42", headers=HEADERS, timeout=CONTRACT_TIMEOUT),
+    ]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.single.LOGGER", MagicMock())
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_sync_single_tender_gateway_error_reconciliation():
+    contract_data = {
+        "status": "active",
+        "id": "42",
+        "value": {"amount": 1, "currency": "UAH", "valueAddedTaxIncluded": True},
+        "items": [{}],
+        "suppliers": [{}],
+    }
+    tender_data = {"id": "33", "status": "active", "procuringEntity": "procuringEntity", "contracts": [contract_data]}
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(
+        side_effect=[
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender_data}))),
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": {"owner": "owner", "tender_token": "token"}}))),
+            MagicMock(status=404),
+        ]
+    )
+    session_mock.post = AsyncMock(
+        return_value=MagicMock(status=504, text=AsyncMock(return_value="Gateway Timeout"))
+    )
+    session_mock.head = AsyncMock(return_value=MagicMock(status=200))
+
+    assert await sync_single_tender(tender_data["id"], session_mock) == {"42": "created"}
+    assert session_mock.post.await_count == 1
+    assert session_mock.head.await_count == 1
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.single.LOGGER", MagicMock())
+async def test_sync_single_tender_attaches_to_feed_sync():
+    contract_data = {"status": "active", "id": "42"}
+    tender_data = {"id": "33", "status": "active", "procuringEntity": "procuringEntity", "contracts": [contract_data]}
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(
+        side_effect=[
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": tender_data}))),
+            MagicMock(status=200, text=AsyncMock(return_value=json.dumps({"data": {"owner": "owner", "tender_token": "token"}}))),
+        ]
+    )
+    feed_sync = asyncio.Event()
+
+    async def sync_contract():
+        await feed_sync.wait()
+
+    feed_task = asyncio.ensure_future(CONTRACTS_IN_FLIGHT.run("42", None, sync_contract))
+    await asyncio.sleep(0)
+    single_task = asyncio.ensure_future(sync_single_tender(tender_data["id"], session_mock))
+    await asyncio.sleep(0.01)
+    feed_sync.set()
+
+    assert await single_task == {"42": "exists"}
+    await feed_task
+    # the contract is neither checked nor posted by the on-demand sync while the feed syncs it
+    assert session_mock.get.await_count == 2
+    session_mock.post.assert_not_awaited()
+
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.single.LOGGER", MagicMock())
+async def test_get_tender_not_found():
+    session_mock = AsyncMock()
+    session_mock.get = AsyncMock(
+        return_value=MagicMock(status=404, text=AsyncMock(return_value=json.dumps({"errors": ["Not Found"]})))
+    )
+
+    with patch("prozorro_bridge_contracting.scheduler.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        with pytest.raises(TenderNotFound):
+            await sync_single_tender("unknown", session_mock)
+
+    # an unknown tender id is not retried until the deadline
+    assert session_mock.get.await_count == 1
+    mocked_sleep.assert_not_awaited()
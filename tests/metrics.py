@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.bridge import post_contract
+from prozorro_bridge_contracting.metrics import Counter, Histogram, Gauge, REGISTRY, render_metrics
+
+
+def test_render_metrics():
+    counter = Counter("test_counter", "Test counter")
+    counter.inc(reason="a")
+    counter.inc(2, reason="a")
+    gauge = Gauge("test_gauge", "Test gauge")
+    gauge.set(7)
+    histogram = Histogram("test_histogram", "Test histogram", (1, 10))
+    histogram.observe(0.5)
+    histogram.observe(5)
+    histogram.observe(50)
+
+    text = render_metrics()
+    for name in ("test_counter", "test_gauge", "test_histogram"):
+        del REGISTRY[name]
+
+    assert '# TYPE test_counter counter' in text
+    assert 'test_counter{reason="a"} 3' in text
+    assert 'test_gauge 7' in text
+    assert 'test_histogram_bucket{le="1"} 1' in text
+    assert 'test_histogram_bucket{le="10"} 2' in text
+    assert 'test_histogram_bucket{le="+Inf"} 3' in text
+    assert 'test_histogram_sum 55.5' in text
+    assert 'test_histogram_count 3' in text
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_post_contract_observes_sync_lag():
+    date = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    contract = {"id": "42", "tender_id": "1984"}
+    session_mock = AsyncMock()
+    session_mock.post = AsyncMock(
+        return_value=MagicMock(status=201, text=AsyncMock(return_value=json.dumps({"data": {}})))
+    )
+
+    with patch("prozorro_bridge_contracting.bridge.CONTRACT_SYNC_LAG") as mocked_lag:
+        await post_contract(contract, session_mock, date)
+
+    assert mocked_lag.observe.call_count == 1
+    assert 299 < mocked_lag.observe.call_args.args[0] < 310
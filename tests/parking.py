@@ -0,0 +1,80 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.bridge import process_tender_contracts
+from prozorro_bridge_contracting.parking import ParkingLane
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+@patch("prozorro_bridge_contracting.bridge.ERROR_INTERVAL", 0)
+async def test_stuck_tender_is_parked():
+    parking = ParkingLane(limit=10, after_attempts=2, after_seconds=60)
+    tender = {
+        "id": "1",
+        "procuringEntity": "procuringEntity",
+        "contracts": [{"id": "1", "status": "active"}],
+    }
+    error_response = MagicMock(status=500, text=AsyncMock(return_value=json.dumps({"error": "Server error"})))
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(side_effect=[error_response, error_response, error_response, MagicMock(status=200)])
+
+    with patch("prozorro_bridge_contracting.bridge.PARKING", parking):
+        await process_tender_contracts(tender, session_mock)
+
+        assert session_mock.head.await_count == 2
+        assert len(parking) == 1
+        assert [[item.contract_id for item in items] for items in parking.parked.values()] == [["1"]]
+        await asyncio.gather(*parking.parked)
+
+    assert session_mock.head.await_count == 4
+    assert len(parking) == 0
+
+
+@pytest.mark.asyncio
+async def test_parking_limit():
+    parking = ParkingLane(limit=1, after_attempts=1, after_seconds=60)
+    release = asyncio.Event()
+
+    assert parking.park([], release.wait()) is True
+    assert parking.park([], release.wait()) is False
+    assert len(parking) == 1
+
+    release.set()
+    await asyncio.gather(*parking.parked)
+    assert len(parking) == 0
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+@patch("prozorro_bridge_contracting.bridge.ERROR_INTERVAL", 0)
+async def test_tender_failing_in_retry_loop_is_parked():
+    parking = ParkingLane(limit=10, after_attempts=2, after_seconds=60)
+    tender = {
+        "id": "1",
+        "procuringEntity": "procuringEntity",
+        "contracts": [{"id": "1", "status": "active"}],
+    }
+    error_response = MagicMock(status=500, text=AsyncMock(return_value=json.dumps({"error": "Server error"})))
+    credentials_response = MagicMock(
+        status=200, text=AsyncMock(return_value=json.dumps({"data": {"owner": "owner", "tender_token": "token"}}))
+    )
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(return_value=MagicMock(status=404))
+    session_mock.get = AsyncMock(side_effect=[error_response, error_response, credentials_response])
+    session_mock.post = AsyncMock(return_value=MagicMock(status=201))
+
+    with patch("prozorro_bridge_contracting.bridge.PARKING", parking), \
+            patch("prozorro_bridge_contracting.scheduler.PARKING", parking), \
+            patch("prozorro_bridge_contracting.scheduler.asyncio.sleep", AsyncMock()):
+        await process_tender_contracts(tender, session_mock)
+
+        # credentials are retried endlessly, the tender is parked after the inner retries
+        assert session_mock.get.await_count == 2
+        assert len(parking) == 1
+        await asyncio.gather(*parking.parked)
+
+    assert session_mock.get.await_count == 3
+    assert session_mock.post.await_count == 1
@@ -0,0 +1,35 @@
+from unittest.mock import patch
+
+from prozorro_bridge_contracting.bridge import check_tender
+from prozorro_bridge_contracting.prefilter import prefilter, REJECTED_TENDERS
+
+
+def test_prefilter():
+    items = [
+        {"id": "1", "procurementMethodType": "esco", "contracts": [{"status": "active"}]},
+        {"id": "2", "procurementMethodType": "belowThreshold", "contracts": [{"status": "pending"}]},
+        {"id": "3", "procurementMethodType": "belowThreshold"},
+        {"id": "4", "procurementMethodType": "belowThreshold", "contracts": [{"status": "active"}]},
+        {"id": "5", "procurementMethodType": "belowThreshold", "mode": "test", "contracts": [{"status": "active"}]},
+    ]
+    before = {rule: REJECTED_TENDERS.get(rule=rule) for rule in ("procurement_method_type", "contract_status", "mode")}
+
+    with patch("prozorro_bridge_contracting.prefilter.EXCLUDED_MODES", ("test",)):
+        accepted = prefilter(items)
+
+    assert [item["id"] for item in accepted] == ["4"]
+    assert REJECTED_TENDERS.get(rule="procurement_method_type") - before["procurement_method_type"] == 1
+    assert REJECTED_TENDERS.get(rule="contract_status") - before["contract_status"] == 2
+    assert REJECTED_TENDERS.get(rule="mode") - before["mode"] == 1
+
+
+@patch("prozorro_bridge_contracting.bridge.LOGGER")
+def test_check_tender_uses_prefilter_rules(mocked_logger):
+    tender = {"id": "1", "procurementMethodType": "esco", "contracts": [{"status": "active"}]}
+    assert check_tender(tender) is False
+
+    with patch("prozorro_bridge_contracting.prefilter.EXCLUDED_PROCUREMENT_METHOD_TYPES", ()):
+        assert check_tender(tender) is True
+
+    with patch("prozorro_bridge_contracting.prefilter.REQUIRED_CONTRACT_STATUSES", ("pending",)):
+        assert check_tender({**tender, "procurementMethodType": "belowThreshold"}) is False
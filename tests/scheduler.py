@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from prozorro_bridge_contracting.scheduler import (
+    Scheduler,
+    get_lane,
+    FRESH_LANE,
+    BACKLOG_LANE,
+    RETRY_LANE,
+)
+
+
+def test_get_lane():
+    fresh_date = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    old_date = (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
+
+    assert get_lane({"contracts": [{"status": "active", "date": fresh_date}]}) == FRESH_LANE
+    assert get_lane({"contracts": [{"status": "active", "date": old_date}]}) == BACKLOG_LANE
+    assert get_lane({"contracts": [{"status": "pending", "date": fresh_date}]}) == BACKLOG_LANE
+    assert get_lane({"contracts": [{"status": "active"}]}) == BACKLOG_LANE
+    assert get_lane({}) == BACKLOG_LANE
+
+
+@pytest.mark.asyncio
+async def test_lane_limits():
+    scheduler = Scheduler({FRESH_LANE: 2, BACKLOG_LANE: 1, RETRY_LANE: 1})
+    running = {FRESH_LANE: 0, BACKLOG_LANE: 0}
+    max_running = {FRESH_LANE: 0, BACKLOG_LANE: 0}
+
+    async def work(lane):
+        async with scheduler.slot(lane):
+            running[lane] += 1
+            max_running[lane] = max(max_running[lane], running[lane])
+            await asyncio.sleep(0)
+            running[lane] -= 1
+
+    await asyncio.gather(*[work(FRESH_LANE) for _ in range(5)], *[work(BACKLOG_LANE) for _ in range(5)])
+
+    assert max_running == {FRESH_LANE: 2, BACKLOG_LANE: 1}
+    assert scheduler.stats() == {
+        FRESH_LANE: {"active": 0, "waiting": 0, "limit": 2},
+        BACKLOG_LANE: {"active": 0, "waiting": 0, "limit": 1},
+        RETRY_LANE: {"active": 0, "waiting": 0, "limit": 1},
+    }
+
+
+@pytest.mark.asyncio
+async def test_backoff_moves_to_retry_lane():
+    scheduler = Scheduler({FRESH_LANE: 1, BACKLOG_LANE: 1, RETRY_LANE: 1})
+
+    with patch("prozorro_bridge_contracting.scheduler.asyncio.sleep", AsyncMock()) as mocked_sleep:
+        async with scheduler.slot(FRESH_LANE) as holder:
+            await scheduler.backoff(5)
+            assert holder.lane is scheduler.lanes[RETRY_LANE]
+            assert scheduler.stats()[FRESH_LANE]["active"] == 0
+            assert scheduler.stats()[RETRY_LANE]["active"] == 1
+
+    mocked_sleep.assert_awaited_once_with(5)
+    assert scheduler.stats()[RETRY_LANE]["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_popped_on_release():
+    scheduler = Scheduler({FRESH_LANE: 1, BACKLOG_LANE: 1, RETRY_LANE: 1})
+    lane = scheduler.lanes[FRESH_LANE]
+    await lane.acquire()
+    waiting = asyncio.ensure_future(lane.acquire())
+    await asyncio.sleep(0)
+
+    waiting.cancel()
+    lane.release()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    assert scheduler.stats()[FRESH_LANE] == {"active": 0, "waiting": 0, "limit": 1}
+
+
+@pytest.mark.asyncio
+async def test_tender_deadline_starts_with_slot():
+    from prozorro_bridge_contracting.bridge import process_contract_items
+
+    scheduler = Scheduler({FRESH_LANE: 1, BACKLOG_LANE: 1, RETRY_LANE: 1})
+    lane = scheduler.lanes[BACKLOG_LANE]
+    await lane.acquire()
+    asyncio.get_event_loop().call_later(0.05, lane.release)
+
+    with patch("prozorro_bridge_contracting.bridge.SCHEDULER", scheduler), \
+            patch("prozorro_bridge_contracting.bridge.TENDER_DEADLINE", 0.03), \
+            patch("prozorro_bridge_contracting.bridge.ERROR_INTERVAL", 0), \
+            patch("prozorro_bridge_contracting.bridge.DEADLINE_EXCEEDED") as mocked_counter:
+        await process_contract_items([], AsyncMock(), BACKLOG_LANE)
+
+    mocked_counter.inc.assert_not_called()
@@ -0,0 +1,96 @@
+from aiohttp.test_utils import TestClient, TestServer
+import asyncio
+import pytest
+from unittest.mock import patch, AsyncMock
+
+from prozorro_bridge_contracting import server
+from prozorro_bridge_contracting.server import create_app
+
+
+async def sync_single_tender_mock(tender_id, session):
+    if tender_id == "broken":
+        raise ConnectionError("Error!")
+    return {f"{tender_id}-1": "created", f"{tender_id}-2": "exists"}
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.server.sync_single_tender", sync_single_tender_mock)
+async def test_sync_view():
+    async with TestClient(TestServer(create_app(AsyncMock()))) as client:
+        response = await client.post("/sync?tender_id=1", json={"tenders": ["2", "broken"]})
+        assert response.status == 200
+        assert await response.json() == {
+            "status": "done",
+            "tenders": {
+                "1": {"contracts": {"1-1": "created", "1-2": "exists"}},
+                "2": {"contracts": {"2-1": "created", "2-2": "exists"}},
+                "broken": {"error": "ConnectionError: Error!"},
+            },
+        }
+
+        response = await client.post("/sync", json={"tender": "1"})
+        assert response.status == 400
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.server.sync_single_tender", sync_single_tender_mock)
+async def test_sync_job_view():
+    async with TestClient(TestServer(create_app(AsyncMock()))) as client:
+        response = await client.post("/sync?tender_id=1&wait=0")
+        assert response.status == 202
+        job_id = (await response.json())["job_id"]
+        await asyncio.sleep(0.01)
+
+        response = await client.get(f"/sync/{job_id}")
+        assert await response.json() == {
+            "job_id": job_id,
+            "status": "done",
+            "tenders": {"1": {"contracts": {"1-1": "created", "1-2": "exists"}}},
+        }
+
+        response = await client.get("/sync/unknown")
+        assert response.status == 404
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.server.sync_single_tender", sync_single_tender_mock)
+@patch("prozorro_bridge_contracting.server.SERVER_TOKEN", "secret")
+@patch("prozorro_bridge_contracting.server.is_local", lambda remote: False)
+async def test_remote_clients_need_token():
+    async with TestClient(TestServer(create_app(AsyncMock()))) as client:
+        response = await client.post("/sync?tender_id=1")
+        assert response.status == 403
+        response = await client.get("/snapshot")
+        assert response.status == 403
+        response = await client.get("/metrics")
+        assert response.status == 200
+
+        response = await client.post("/sync?tender_id=1", headers={"Authorization": "Bearer secret"})
+        assert response.status == 200
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.server.SYNC_JOBS_LIMIT", 1)
+async def test_running_jobs_are_not_evicted():
+    release = asyncio.Event()
+
+    async def sync_single_tender(tender_id, session):
+        await release.wait()
+        return {f"{tender_id}-1": "created"}
+
+    with patch("prozorro_bridge_contracting.server.sync_single_tender", sync_single_tender), \
+            patch.dict(server.jobs, clear=True):
+        async with TestClient(TestServer(create_app(AsyncMock()))) as client:
+            job_ids = []
+            for tender_id in ("1", "2"):
+                response = await client.post(f"/sync?tender_id={tender_id}&wait=0")
+                job_ids.append((await response.json())["job_id"])
+            assert list(server.jobs) == job_ids
+            assert len(server.job_tasks) == 2
+
+            release.set()
+            await asyncio.sleep(0.01)
+            assert not server.job_tasks
+            response = await client.post("/sync?tender_id=3&wait=0")
+            # finished jobs are evicted over the limit
+            assert list(server.jobs) == [(await response.json())["job_id"]]
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.bridge import process_tender_contracts
+from prozorro_bridge_contracting.validation import validate_contract, VALIDATION_RULE_HITS
+
+
+def get_contract(**kwargs):
+    contract = {
+        "id": "1",
+        "status": "active",
+        "tender_id": "2",
+        "procuringEntity": {"name": "Entity"},
+        "value": {"amount": 100, "amountNet": 80, "currency": "UAH"},
+        "period": {"startDate": "2021-01-01T00:00:00+02:00", "endDate": "2021-02-01T00:00:00+02:00"},
+        "items": [{"id": "3", "quantity": 1, "unit": {"value": {"amount": 100, "currency": "UAH"}}}],
+    }
+    contract.update(kwargs)
+    return contract
+
+
+@patch("prozorro_bridge_contracting.validation.LOGGER", MagicMock())
+def test_delivery_date_fixed():
+    contract = get_contract(items=[{"deliveryDate": {"startDate": "2021-02-01", "endDate": "2021-01-01"}}])
+    fixed = VALIDATION_RULE_HITS.get(rule="delivery_date", action="fixed")
+
+    assert validate_contract(contract) is None
+    assert contract["items"] == [{"deliveryDate": {"endDate": "2021-01-01"}}]
+    assert VALIDATION_RULE_HITS.get(rule="delivery_date", action="fixed") - fixed == 1
+
+
+@pytest.mark.parametrize("contract,problem", [
+    (get_contract(), None),
+    (get_contract(value=None, items=[{}]), None),
+    (get_contract(tender_id=None), "required_fields: missing tender_id"),
+    (get_contract(items=[1]), "items: items should be a list of objects"),
+    (get_contract(items=[{"id": "3", "quantity": -1}]), "items: invalid quantity -1 of item 3"),
+    (
+        get_contract(period={"startDate": "2021-02-01T00:00:00+02:00", "endDate": "2021-01-01T00:00:00+02:00"}),
+        "period: period startDate 2021-02-01T00:00:00+02:00 is after endDate 2021-01-01T00:00:00+02:00",
+    ),
+    (get_contract(value={"amount": "100", "currency": "UAH"}), "value: invalid value amount '100'"),
+    (
+        get_contract(value={"amount": 100, "amountNet": 120, "currency": "UAH"}),
+        "value: value amountNet 120 should be a number not greater than amount 100",
+    ),
+    (get_contract(value={"amount": 100}), "value: missing value currency"),
+    (
+        get_contract(value={"amount": 100, "currency": "USD"}),
+        "value: item 3 unit value currency UAH differs from USD",
+    ),
+])
+def test_validate_contract(contract, problem):
+    assert validate_contract(contract) == problem
+
+
+def test_disabled_rule():
+    contract = get_contract(value={"amount": 100})
+    with patch("prozorro_bridge_contracting.validation.DISABLED_VALIDATION_RULES", ("value",)):
+        assert validate_contract(contract) is None
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER")
+async def test_invalid_contract_is_not_posted(mocked_logger):
+    contract = get_contract(period={"startDate": "2021-02-01", "endDate": "2021-01-01"})
+    del contract["tender_id"]
+    tender = {"id": "2", "contracts": [contract], "procuringEntity": {"name": "Entity"}}
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(return_value=MagicMock(status=404))
+
+    await process_tender_contracts(tender, session_mock)
+
+    assert session_mock.get.await_count == 0
+    assert session_mock.post.await_count == 0
+    assert mocked_logger.error.call_count == 1
+    assert "ATTENTION! Invalid contract 1 of tender 2" in mocked_logger.error.call_args.args[0]
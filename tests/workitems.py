@@ -0,0 +1,139 @@
+from copy import deepcopy
+import asyncio
+import gc
+import json
+import tracemalloc
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from prozorro_bridge_contracting.bridge import BASE_URL, schedule_listing, process_tender_contracts
+from prozorro_bridge_contracting.workitems import get_contract_items
+
+
+def make_large_tender(
+    tender_id: str, contracts_count: int = 50, items_count: int = 100, active_every: int = 5
+) -> dict:
+    items = [
+        {
+            "id": f"{i:032}",
+            "description": "Item description " * 10,
+            "classification": {"scheme": "ДК021", "id": "44617100-9", "description": "Description " * 5},
+            "quantity": i,
+            "deliveryDate": {"startDate": "2021-01-01T00:00:00+02:00", "endDate": "2021-12-31T00:00:00+02:00"},
+        }
+        for i in range(items_count)
+    ]
+    return {
+        "id": tender_id,
+        "dateModified": "2021-01-01T00:00:00+02:00",
+        "procurementMethodType": "belowThreshold",
+        "procuringEntity": {"name": "Procuring entity", "identifier": {"id": "00000000"}},
+        "lots": [{"id": f"{i:032}", "title": "Lot title " * 20} for i in range(contracts_count)],
+        "contracts": [
+            {
+                "id": f"{tender_id}{i:08}",
+                "status": "active" if i % active_every == 0 else "cancelled",
+                "items": deepcopy(items),
+                "documents": [{"title": "Document " * 10, "url": "http://docs"} for _ in range(10)],
+            }
+            for i in range(contracts_count)
+        ],
+    }
+
+
+def test_get_contract_items():
+    tender = {
+        "id": "1",
+        "dateModified": "2021-01-01T00:00:00+02:00",
+        "procuringEntity": "procuringEntity",
+        "mode": "test",
+        "lots": [{"id": "1"}],
+        "contracts": [{"id": "1", "status": "active"}, {"id": "2", "status": "pending"}],
+    }
+
+    items = get_contract_items(tender)
+
+    assert len(items) == 1
+    assert items[0].contract is tender["contracts"][0]
+    assert items[0].contract_id == "1"
+    assert items[0].date_modified == tender["dateModified"]
+    assert items[0].tender == {"id": "1", "procuringEntity": "procuringEntity", "mode": "test"}
+    assert not hasattr(items[0], "__dict__")
+
+
+async def measure_running_page(schedule) -> int:
+    """
+    Returns memory (traced by tracemalloc) held by the page work that outlives the page,
+    like parked tenders do after the crawler has moved on
+    """
+    started = asyncio.Event()
+    page_size = 5
+
+    async def head(*args, **kwargs):
+        if session.head.await_count == page_size:
+            started.set()
+        await asyncio.Event().wait()
+
+    session = AsyncMock()
+    session.head = AsyncMock(side_effect=head)
+    gc.collect()
+    tracemalloc.start()
+    page = [make_large_tender(f"{i:024}") for i in range(page_size)]
+    tasks = schedule(page, session)
+    # the crawler drops the page once the handler returns
+    del page
+    await asyncio.wait_for(started.wait(), 5)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return size
+
+
+@pytest.mark.asyncio
+async def test_running_page_memory():
+    """
+    Work outliving its page holds only active contract work items,
+    previously every tender was held by its coroutine.
+    LOGGER isn't mocked, a mock would keep the formatted tenders it was called with.
+    """
+    def schedule_work_items(page, session):
+        return [asyncio.ensure_future(schedule_listing(session, tender)) for tender in page]
+
+    def schedule_whole_tenders(page, session):
+        return [asyncio.ensure_future(process_tender_contracts(tender, session)) for tender in page]
+
+    work_items_size = await measure_running_page(schedule_work_items)
+    whole_tenders_size = await measure_running_page(schedule_whole_tenders)
+
+    assert work_items_size < whole_tenders_size / 3
+
+
+@pytest.mark.asyncio
+@patch("prozorro_bridge_contracting.bridge.LOGGER", MagicMock())
+async def test_sync_retry_skips_synced_contracts():
+    tender = {
+        "id": "1",
+        "procurementMethodType": "belowThreshold",
+        "procuringEntity": "procuringEntity",
+        "contracts": [{"id": "1", "status": "active"}, {"id": "2", "status": "active"}],
+    }
+    session_mock = AsyncMock()
+    session_mock.head = AsyncMock(
+        side_effect=[
+            MagicMock(status=200),
+            MagicMock(status=500, text=AsyncMock(return_value=json.dumps({"error": "Server error"}))),
+            MagicMock(status=200),
+        ]
+    )
+
+    with patch("prozorro_bridge_contracting.bridge.asyncio.sleep", AsyncMock()):
+        await schedule_listing(session_mock, tender)
+
+    assert [c.args[0] for c in session_mock.head.call_args_list] == [
+        f"{BASE_URL}/contracts/1",
+        f"{BASE_URL}/contracts/2",
+        f"{BASE_URL}/contracts/2",
+    ]